@@ -8,10 +8,24 @@ Starte mit: streamlit run app.py
 
 import streamlit as st
 import requests
-from PIL import Image, ImageEnhance, ImageFilter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from PIL import Image, ImageEnhance
 import io
+import hashlib
+import html
+import os
+from bisect import bisect_left
+import heapq
+import sqlite3
+import threading
 import numpy as np
+try:
+    import orjson
+except ImportError:
+    orjson = None
 from typing import Optional, Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import re
 import time
 
@@ -67,8 +81,14 @@ class OCREngine:
     """OCR Engine für Kartentexterkennung"""
     
     @staticmethod
-    def preprocess_image_for_ocr(image: Image.Image, region: str = "title") -> Image.Image:
-        """Bereitet Bild für OCR vor"""
+    def preprocess_image_for_ocr(image: Image.Image, region: str = "title",
+                                 upscale: bool = False) -> Image.Image:
+        """
+        Bereitet Bild für OCR vor
+        
+        Ohne Schärfen (aktuelle OCR-Engines bevorzugen ungeschärfte Eingaben);
+        die Verdopplung der Größe nur auf Wunsch, sobald ein OCR-Backend sie braucht.
+        """
         # In Graustufen konvertieren
         gray = image.convert('L')
         
@@ -76,19 +96,25 @@ class OCREngine:
         enhancer = ImageEnhance.Contrast(gray)
         enhanced = enhancer.enhance(2.0)
         
-        # Schärfen
-        sharpened = enhanced.filter(ImageFilter.SHARPEN)
+        # Größe verdoppeln für kleine Schrift
+        if upscale:
+            width, height = enhanced.size
+            enhanced = enhanced.resize((width * 2, height * 2), Image.Resampling.BICUBIC)
         
-        # Größe verdoppeln für bessere OCR
-        width, height = sharpened.size
-        sharpened = sharpened.resize((width * 2, height * 2), Image.Resampling.LANCZOS)
-        
-        return sharpened
+        return enhanced
     
     @staticmethod
-    def extract_card_regions(image: Image.Image) -> Dict[str, Image.Image]:
-        """Extrahiert relevante Regionen einer MTG Karte"""
-        width, height = image.size
+    def extract_card_regions(image: Image.Image) -> Dict[str, np.ndarray]:
+        """
+        Extrahiert relevante Regionen einer MTG Karte
+        
+        Das Bild wird einmal in ein RGB-Array umgewandelt; die Regionen sind
+        Views darauf (keine Kopien). Wo PIL gebraucht wird: to_pil_image().
+        """
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        pixels = np.asarray(image)
+        height, width = pixels.shape[:2]
         
         regions = {}
         
@@ -97,36 +123,88 @@ class OCREngine:
         title_bottom = int(height * 0.09)
         title_left = int(width * 0.05)
         title_right = int(width * 0.78)
-        regions['title'] = image.crop((title_left, title_top, title_right, title_bottom))
+        regions['title'] = pixels[title_top:title_bottom, title_left:title_right]
         
         # Sammlernummer & Set-Info (unten links, moderne Karten)
         info_top = int(height * 0.94)
         info_bottom = int(height * 0.99)
         info_left = int(width * 0.05)
         info_right = int(width * 0.55)
-        regions['collector_info'] = image.crop((info_left, info_top, info_right, info_bottom))
+        regions['collector_info'] = pixels[info_top:info_bottom, info_left:info_right]
         
         # Set-Symbol-Bereich (rechts in der Typenzeile)
         symbol_top = int(height * 0.545)
         symbol_bottom = int(height * 0.595)
         symbol_left = int(width * 0.82)
         symbol_right = int(width * 0.97)
-        regions['set_symbol'] = image.crop((symbol_left, symbol_top, symbol_right, symbol_bottom))
+        regions['set_symbol'] = pixels[symbol_top:symbol_bottom, symbol_left:symbol_right]
         
         # Artwork-Bereich für Bildvergleich
         art_top = int(height * 0.11)
         art_bottom = int(height * 0.54)
         art_left = int(width * 0.07)
         art_right = int(width * 0.93)
-        regions['artwork'] = image.crop((art_left, art_top, art_right, art_bottom))
+        regions['artwork'] = pixels[art_top:art_bottom, art_left:art_right]
         
         return regions
 
 
+def to_pil_image(image) -> Image.Image:
+    """Wandelt ein Region-Array (oder PIL-Bild) in ein PIL-Bild um"""
+    if isinstance(image, np.ndarray):
+        return Image.fromarray(np.ascontiguousarray(image))
+    return image
+
+
+# Scryfall Endpunkte
+SCRYFALL_API_URL = "https://api.scryfall.com"
+_URL_CARDS = f"{SCRYFALL_API_URL}/cards"
+_URL_NAMED = f"{_URL_CARDS}/named"
+_URL_SEARCH = f"{_URL_CARDS}/search"
+_URL_AUTOCOMPLETE = f"{_URL_CARDS}/autocomplete"
+_URL_RANDOM = f"{_URL_CARDS}/random"
+_URL_CARD_NAMES = f"{SCRYFALL_API_URL}/catalog/card-names"
+
+
+@st.cache_resource
+def _http() -> requests.Session:
+    """Gemeinsame HTTP-Session mit Connection-Pooling (Keep-Alive statt neuem TLS-Handshake pro Request)"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=20,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=[429, 500, 502, 503, 504]
+        )
+    )
+    session.mount("https://", adapter)
+    
+    # Scryfall verlangt einen aussagekräftigen User-Agent
+    session.headers.update({
+        "User-Agent": "MTGCardScanner/1.0",
+        "Accept": "application/json;q=0.9,*/*;q=0.8"
+    })
+    return session
+
+
+def _json(response: requests.Response):
+    """Parst eine JSON-Antwort - mit orjson (schneller bei großen Suchergebnissen) falls installiert"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+
 class ScryfallAPI:
-    """Scryfall API Client mit erweiterten Funktionen"""
+    """
+    Scryfall API Client mit erweiterten Funktionen
+    
+    Die JSON-Getter nutzen st.cache_resource: Treffer liefern dasselbe Objekt
+    ohne Pickle-Kopie. Die Ergebnisse daher nur lesen, nicht verändern.
+    """
     
-    BASE_URL = "https://api.scryfall.com"
+    BASE_URL = SCRYFALL_API_URL
     
     @staticmethod
     def _rate_limit():
@@ -134,52 +212,85 @@ class ScryfallAPI:
         time.sleep(0.1)
     
     @staticmethod
-    @st.cache_data(ttl=3600)
+    @st.cache_resource(ttl=3600, max_entries=2048)
     def search_card(name: str) -> Optional[Dict]:
         """Sucht eine Karte nach Namen (fuzzy)"""
         try:
-            response = requests.get(
-                f"{ScryfallAPI.BASE_URL}/cards/named",
+            response = _http().get(
+                _URL_NAMED,
                 params={"fuzzy": name},
                 timeout=10
             )
             if response.status_code == 200:
-                return response.json()
+                return _json(response)
         except Exception as e:
             st.error(f"API Fehler: {e}")
         return None
     
     @staticmethod
-    @st.cache_data(ttl=3600)
+    @st.cache_resource(ttl=3600, max_entries=2048)
     def search_card_exact(name: str) -> Optional[Dict]:
         """Sucht eine Karte nach exaktem Namen"""
         try:
-            response = requests.get(
-                f"{ScryfallAPI.BASE_URL}/cards/named",
+            response = _http().get(
+                _URL_NAMED,
                 params={"exact": name},
                 timeout=10
             )
             if response.status_code == 200:
-                return response.json()
+                return _json(response)
         except:
             pass
         return None
     
     @staticmethod
-    @st.cache_data(ttl=3600)
-    def get_all_prints(card_name: str) -> List[Dict]:
-        """Holt alle Versionen einer Karte"""
+    def find_card(name: str, exact: bool = False) -> Optional[Dict]:
+        """
+        Sucht eine Karte; bei kanonischen Namen (z.B. aus der Autovervollständigung)
+        zuerst per exaktem Match, der schneller ist als die Fuzzy-Suche
+        """
+        if exact:
+            card = ScryfallAPI.search_card_exact(name)
+            if card:
+                return card
+        return ScryfallAPI.search_card(name)
+    
+    @staticmethod
+    @st.cache_resource(ttl=3600, max_entries=2048)
+    def get_all_prints(card_name: str, oracle_id: Optional[str] = None) -> List[Dict]:
+        """
+        Holt alle Versionen einer Karte
+        
+        Ist die oracle_id bereits bekannt (Karte schon geladen), entfällt
+        der vorgeschaltete Namens-Request. Ohne oracle_id wird zuerst direkt
+        nach dem exakten Namen gesucht (ein Request), erst danach unscharf.
+        """
         try:
-            card = ScryfallAPI.search_card(card_name)
-            if not card:
-                return []
+            if not oracle_id and '"' not in card_name:
+                response = _http().get(
+                    _URL_SEARCH,
+                    params={
+                        "q": f'!"{card_name}"',
+                        "unique": "prints",
+                        "order": "released"
+                    },
+                    timeout=15
+                )
+                if response.status_code == 200:
+                    return _json(response).get("data", [])
             
-            oracle_id = card.get("oracle_id")
             if not oracle_id:
-                return [card]
+                # Kein exakter Treffer - Namen unscharf auflösen
+                card = ScryfallAPI.search_card(card_name)
+                if not card:
+                    return []
+                
+                oracle_id = card.get("oracle_id")
+                if not oracle_id:
+                    return [card]
             
-            response = requests.get(
-                f"{ScryfallAPI.BASE_URL}/cards/search",
+            response = _http().get(
+                _URL_SEARCH,
                 params={
                     "q": f"oracleid:{oracle_id}",
                     "unique": "prints",
@@ -189,44 +300,44 @@ class ScryfallAPI:
             )
             
             if response.status_code == 200:
-                data = response.json()
+                data = _json(response)
                 return data.get("data", [])
         except Exception as e:
             st.error(f"API Fehler: {e}")
         return []
     
     @staticmethod
-    @st.cache_data(ttl=3600)
+    @st.cache_resource(ttl=3600, max_entries=2048)
     def get_card_by_set_and_number(set_code: str, collector_number: str) -> Optional[Dict]:
         """Holt Karte nach Set und Sammlernummer"""
         try:
             # Sammlernummer bereinigen
             collector_number = collector_number.lstrip('0') or '0'
             
-            response = requests.get(
-                f"{ScryfallAPI.BASE_URL}/cards/{set_code.lower()}/{collector_number}",
+            response = _http().get(
+                f"{_URL_CARDS}/{set_code.lower()}/{collector_number}",
                 timeout=10
             )
             if response.status_code == 200:
-                return response.json()
+                return _json(response)
         except:
             pass
         return None
     
     @staticmethod
-    @st.cache_data(ttl=3600)
+    @st.cache_resource(ttl=3600, max_entries=2048)
     def autocomplete(query: str) -> List[str]:
         """Autovervollständigung für Kartennamen"""
         if len(query) < 2:
             return []
         try:
-            response = requests.get(
-                f"{ScryfallAPI.BASE_URL}/cards/autocomplete",
+            response = _http().get(
+                _URL_AUTOCOMPLETE,
                 params={"q": query},
                 timeout=5
             )
             if response.status_code == 200:
-                return response.json().get("data", [])
+                return _json(response).get("data", [])
         except:
             pass
         return []
@@ -235,26 +346,46 @@ class ScryfallAPI:
     def get_random_card() -> Optional[Dict]:
         """Holt eine zufällige Karte"""
         try:
-            response = requests.get(
-                f"{ScryfallAPI.BASE_URL}/cards/random",
+            response = _http().get(
+                _URL_RANDOM,
                 timeout=10
             )
             if response.status_code == 200:
-                return response.json()
+                return _json(response)
         except:
             pass
         return None
     
     @staticmethod
-    def download_card_image(card: Dict, size: str = "normal") -> Optional[Image.Image]:
-        """Lädt Kartenbild herunter"""
+    def download_card_image(card: Dict, size: str = "normal",
+                            session: Optional[requests.Session] = None) -> Optional[Image.Image]:
+        """
+        Lädt Kartenbild herunter
+        
+        Aus Worker-Threads heraus sollte die Session übergeben werden, da
+        st.cache_resource dort keinen Script-Kontext hat.
+        """
         url = get_card_image_url(card, size)
         if not url:
             return None
+        return ScryfallAPI.download_image(url, session, image_format="PNG" if size == "png" else "JPEG")
+    
+    @staticmethod
+    def download_image(url: str, session: Optional[requests.Session] = None,
+                       image_format: str = "JPEG") -> Optional[Image.Image]:
+        """
+        Lädt ein Bild von einer bereits bekannten URL herunter
+        
+        Scryfall liefert alle Größen außer "png" als JPEG - das Format wird
+        vorgegeben statt über alle Plugins erkannt, und das Bild wird sofort
+        dekodiert (im aufrufenden Thread, nicht erst beim ersten Zugriff).
+        """
         try:
-            response = requests.get(url, timeout=15)
+            response = (session or _http()).get(url, timeout=15)
             if response.status_code == 200:
-                return Image.open(io.BytesIO(response.content))
+                image = Image.open(io.BytesIO(response.content), formats=[image_format])
+                image.load()
+                return image
         except:
             pass
         return None
@@ -264,117 +395,365 @@ class ScryfallAPI:
 # CARD MATCHER - Bildvergleich für Versionserkennung
 # ============================================================================
 
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormale DCT-II Matrix (n x n) für den pHash"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix.astype(np.float32)
+
+
+_DCT_MATRIX = _dct_matrix(32)
+
+
+if hasattr(int, "bit_count"):
+    def _popcount(value: int) -> int:
+        """Anzahl gesetzter Bits (Python 3.10+: native POPCNT)"""
+        return value.bit_count()
+else:
+    def _popcount(value: int) -> int:
+        """Anzahl gesetzter Bits"""
+        return bin(value).count("1")
+
+
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+
+def _popcount_u64(values: np.ndarray) -> np.ndarray:
+    """Gesetzte Bits je Element eines uint64-Arrays (SWAR, vollständig vektorisiert)"""
+    x = values - ((values >> np.uint64(1)) & _M1)
+    x = (x & _M2) + ((x >> np.uint64(2)) & _M2)
+    x = (x + (x >> np.uint64(4))) & _M4
+    return (x * _H01) >> np.uint64(56)
+
+
+# Bin-Offsets für das 3x16-Bin Farbhistogramm (R, G, B)
+_CHANNEL_BIN_OFFSETS = np.array([0, 16, 32], dtype=np.uint8)
+
+
+# Bei Änderungen an Hash/Histogramm erhöhen - alte Einträge gelten dann als Miss
+FEATURE_CACHE_VERSION = 5
+FEATURE_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".cache", "mtg_card_scanner", "features.db"
+)
+
+
+class FeatureCache:
+    """Persistenter Cache (SQLite) für Referenz-Merkmale je Scryfall-ID"""
+    
+    def __init__(self, path: str):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+        except (OSError, sqlite3.Error):
+            # Kein beschreibbares Verzeichnis - nur für diesen Prozess cachen
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+        
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS features ("
+                "scryfall_id TEXT PRIMARY KEY, version INTEGER, "
+                "phash TEXT, histogram BLOB)"
+            )
+    
+    def get_many(self, scryfall_ids: List[str]) -> Dict[str, Tuple[int, np.ndarray]]:
+        """Liefert (pHash, Histogramm) für alle bereits gecachten IDs"""
+        if not scryfall_ids:
+            return {}
+        
+        placeholders = ",".join("?" * len(scryfall_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT scryfall_id, phash, histogram FROM features "
+                f"WHERE version = ? AND scryfall_id IN ({placeholders})",
+                [FEATURE_CACHE_VERSION, *scryfall_ids]
+            ).fetchall()
+        
+        return {
+            scryfall_id: (int(phash, 16), np.frombuffer(histogram, dtype=np.float32))
+            for scryfall_id, phash, histogram in rows
+        }
+    
+    def put_many(self, entries: Dict[str, Tuple[int, np.ndarray]]):
+        """Speichert (pHash, Histogramm) je Scryfall-ID"""
+        if not entries:
+            return
+        
+        rows = [
+            (scryfall_id, FEATURE_CACHE_VERSION, format(phash, "016x"),
+             np.asarray(histogram, dtype=np.float32).tobytes())
+            for scryfall_id, (phash, histogram) in entries.items()
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?)", rows
+            )
+
+
+@st.cache_resource
+def _feature_cache() -> FeatureCache:
+    """Prozessweit geteilter Merkmals-Cache"""
+    return FeatureCache(FEATURE_CACHE_PATH)
+
+
 class CardMatcher:
     """Kartenabgleich mittels Bildvergleich"""
     
     @staticmethod
-    def compute_image_hash(image: Image.Image, hash_size: int = 16) -> np.ndarray:
-        """Berechnet einen perzeptuellen Hash (pHash)"""
-        # Auf kleine Größe bringen
-        small = image.convert('L').resize((hash_size, hash_size), Image.Resampling.LANCZOS)
-        pixels = np.array(small, dtype=np.float64)
+    def hash_pixels(image) -> np.ndarray:
+        """Verkleinert ein Bild (PIL oder Array) auf die 32x32 Graustufen-Eingabe des pHash"""
+        # BOX mittelt - genau der Tiefpass, den der pHash braucht, und
+        # deutlich günstiger als LANCZOS
+        small = to_pil_image(image).convert('L').resize((32, 32), Image.Resampling.BOX)
+        return np.asarray(small, dtype=np.float32)
+    
+    @staticmethod
+    def hash_pixel_batch(pixels: np.ndarray) -> List[int]:
+        """
+        Berechnet pHashes für einen ganzen Stapel (N, 32, 32) in einem Durchlauf
+        
+        Returns:
+            Liste von 64-Bit Hashes (int), in Reihenfolge der Eingabe
+        """
+        count = len(pixels)
+        if count == 0:
+            return []
+        
+        # 2D-DCT für alle Bilder, nur die niedrigen Frequenzen (8x8 oben links)
+        dct = (_DCT_MATRIX @ pixels @ _DCT_MATRIX.T)[:, :8, :8].reshape(count, 64)
         
-        # DCT-ähnliche Transformation (vereinfacht)
-        avg = pixels.mean()
-        diff = pixels > avg
+        # Median ohne DC-Anteil als Schwelle (je Bild)
+        medians = np.median(dct[:, 1:], axis=1, keepdims=True)
+        packed = np.packbits(dct > medians, axis=1)
         
-        return diff.flatten()
+        return [int(value) for value in packed.view(">u8").ravel()]
     
     @staticmethod
-    def compare_hashes(hash1: np.ndarray, hash2: np.ndarray) -> float:
+    def compute_image_hash(image) -> int:
+        """Berechnet einen perzeptuellen Hash (DCT-pHash, 64 Bit)"""
+        return CardMatcher.hash_pixel_batch(CardMatcher.hash_pixels(image)[None])[0]
+    
+    @staticmethod
+    def compare_hashes(hash1: Optional[int], hash2: Optional[int]) -> float:
         """Vergleicht zwei Hashes und gibt Ähnlichkeit zurück (0-1)"""
         if hash1 is None or hash2 is None:
             return 0.0
         
         # Hamming-Distanz
-        diff = np.sum(hash1 != hash2)
-        max_diff = len(hash1)
+        diff = _popcount(hash1 ^ hash2)
         
-        similarity = 1.0 - (diff / max_diff)
+        similarity = 1.0 - (diff / 64)
         return similarity
     
+    @staticmethod
+    def compute_color_histogram(image) -> np.ndarray:
+        """
+        Berechnet ein grobes Farbhistogramm (auf 64x64 verkleinert)
+        
+        Das Histogramm wird zentriert und auf Länge 1 normiert zurückgegeben,
+        damit die Korrelation zweier Histogramme nur noch ein Skalarprodukt ist.
+        """
+        # reducing_gap: schnelles zweistufiges Verkleinern bei großen Fotos
+        small = to_pil_image(image).resize((64, 64), Image.Resampling.BICUBIC, reducing_gap=2.0)
+        if small.mode != 'RGB':
+            # convert() kopiert auch bei gleichem Modus - nur wenn nötig
+            small = small.convert('RGB')
+        
+        # 16 Bins pro Kanal (48 statt 768 Werte) - für den groben Farbvergleich
+        # ausreichend und deutlich günstiger zu speichern und zu korrelieren.
+        # Ein einziges bincount über (Wert >> 4) + Kanal-Offset direkt auf dem Puffer.
+        bins = (np.asarray(small) >> 4) + _CHANNEL_BIN_OFFSETS
+        hist = np.bincount(bins.ravel(), minlength=48).astype(np.float32)
+        
+        hist -= hist.mean()
+        hist /= (np.sqrt(hist @ hist) + 1e-10)
+        return hist
+    
+    @staticmethod
+    def compare_histograms(hist1: np.ndarray, hist2: np.ndarray) -> float:
+        """Vergleicht zwei vorberechnete Farbhistogramme (Pearson-Korrelation)"""
+        correlation = float(hist1 @ hist2)
+        
+        return max(0.0, correlation)
+    
+    @staticmethod
+    def compare_hash_batch(query_hash: int, ref_hashes: List[int]) -> np.ndarray:
+        """Ähnlichkeit (0-1) eines Hashes zu vielen Referenz-Hashes in einem Durchlauf"""
+        refs = np.array(ref_hashes, dtype=np.uint64)
+        distances = _popcount_u64(refs ^ np.uint64(query_hash))
+        return 1.0 - distances / 64.0
+    
     @staticmethod
     def compare_color_histograms(img1: Image.Image, img2: Image.Image) -> float:
         """Vergleicht Farbhistogramme"""
-        # Auf gleiche Größe bringen
-        size = (64, 64)
-        img1_resized = img1.resize(size).convert('RGB')
-        img2_resized = img2.resize(size).convert('RGB')
-        
-        # Histogramme berechnen
-        hist1 = img1_resized.histogram()
-        hist2 = img2_resized.histogram()
+        return CardMatcher.compare_histograms(
+            CardMatcher.compute_color_histogram(img1),
+            CardMatcher.compute_color_histogram(img2)
+        )
+    
+    @staticmethod
+    def compute_reference_features(ref_image: Image.Image) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Bereitet das Artwork eines Referenzbildes auf
         
-        # Normalisieren
-        hist1 = np.array(hist1, dtype=np.float64)
-        hist2 = np.array(hist2, dtype=np.float64)
+        Returns:
+            (32x32 Hash-Eingabe, Farbhistogramm) - der Hash selbst wird
+            gesammelt über hash_pixel_batch berechnet
+        """
+        regions = OCREngine.extract_card_regions(ref_image)
+        ref_artwork = regions.get('artwork')
         
-        hist1 /= (hist1.sum() + 1e-10)
-        hist2 /= (hist2.sum() + 1e-10)
+        if ref_artwork is None:
+            return None
         
-        # Korrelation
-        correlation = np.corrcoef(hist1, hist2)[0, 1]
+        return (
+            CardMatcher.hash_pixels(ref_artwork),
+            CardMatcher.compute_color_histogram(ref_artwork)
+        )
+    
+    @staticmethod
+    def load_reference_features(image_url: str,
+                                session: Optional[requests.Session] = None) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Lädt ein Referenzbild und bereitet es direkt auf (für Worker-Threads)
         
-        return max(0.0, correlation)
+        Download, JPEG-Dekodierung, Zuschnitt und Verkleinerung laufen so
+        überlappend im Worker; PIL gibt dabei den GIL frei. Nur der pHash
+        selbst wird anschließend gesammelt berechnet.
+        """
+        ref_image = ScryfallAPI.download_image(image_url, session)
+        if ref_image is None:
+            return None
+        return CardMatcher.compute_reference_features(ref_image)
     
     @staticmethod
-    def find_best_version_match(user_artwork: Image.Image, card_name: str, 
-                                progress_callback=None) -> List[Dict]:
-        """Findet die beste Versionsübereinstimmung durch Bildvergleich"""
-        all_prints = ScryfallAPI.get_all_prints(card_name)
+    def find_best_version_match(user_artwork: np.ndarray, card_name: str, 
+                                progress_callback=None,
+                                oracle_id: Optional[str] = None,
+                                top_k: int = 11) -> List[Dict]:
+        """
+        Findet die beste Versionsübereinstimmung durch Bildvergleich
+        
+        Die besten top_k Ergebnisse (Treffer plus angezeigte Alternativen) sind
+        vollständig bewertet; Drucke, die diese sicher nicht erreichen, fehlen.
+        """
+        all_prints = ScryfallAPI.get_all_prints(card_name, oracle_id)
         
         if not all_prints:
             return []
         
+        # Merkmale des User-Artworks nur einmal berechnen
         user_hash = CardMatcher.compute_image_hash(user_artwork)
+        user_hist = CardMatcher.compute_color_histogram(user_artwork)
         results = []
+        candidates = []
+        
+        def add_candidate(card: Dict, image_url: Optional[str], ref_hash: int, ref_hist: np.ndarray):
+            candidates.append((card, image_url, ref_hash, ref_hist))
+        
+        # Bereits bekannte Referenz-Merkmale aus dem Cache (Drucke ändern sich nicht)
+        cache = _feature_cache()
+        cached = cache.get_many([card["id"] for card in all_prints if card.get("id")])
+        to_download = []
+        for card in all_prints:
+            # Bild-URL ("small") nur einmal pro Druck bestimmen - für Download und Galerie
+            image_url = get_card_image_url(card, "small")
+            features = cached.get(card.get("id"))
+            if features is not None:
+                add_candidate(card, image_url, *features)
+            elif image_url:
+                to_download.append((card, image_url))
         
+        # Fehlende Bilder parallel laden und aufbereiten - die Scryfall-CDN
+        # (*.scryfall.io) ist nicht rate-limitiert. Für 32x32-Hash und
+        # 64x64-Histogramm reicht die "small"-Größe (146x204) völlig.
+        session = _http()
         total = len(all_prints)
-        for i, card in enumerate(all_prints):
-            if progress_callback:
-                progress_callback((i + 1) / total)
+        done = total - len(to_download)
+        downloaded = []
+        
+        if progress_callback and done:
+            progress_callback(done / total)
+        
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = {
+                executor.submit(CardMatcher.load_reference_features, image_url, session): (card, image_url)
+                for card, image_url in to_download
+            }
             
-            try:
-                # Referenzbild laden
-                ref_image = ScryfallAPI.download_card_image(card, "normal")
-                if ref_image is None:
-                    continue
-                
-                # Artwork extrahieren
-                regions = OCREngine.extract_card_regions(ref_image)
-                ref_artwork = regions.get('artwork')
+            for future in as_completed(futures):
+                done += 1
+                if progress_callback:
+                    progress_callback(done / total)
                 
-                if ref_artwork is None:
+                card, image_url = futures[future]
+                try:
+                    features = future.result()
+                    if features is None:
+                        continue
+                    
+                    downloaded.append((card, image_url, *features))
+                    
+                except Exception as e:
                     continue
-                
-                # Hash-Vergleich
-                ref_hash = CardMatcher.compute_image_hash(ref_artwork)
-                hash_similarity = CardMatcher.compare_hashes(user_hash, ref_hash)
-                
-                # Farbvergleich
-                color_similarity = CardMatcher.compare_color_histograms(user_artwork, ref_artwork)
-                
-                # Gesamtscore (gewichtet)
-                total_score = (hash_similarity * 0.7) + (color_similarity * 0.3)
-                
-                results.append({
-                    "card": card,
-                    "score": total_score,
-                    "hash_score": hash_similarity,
-                    "color_score": color_similarity,
-                    "name": card.get("name"),
-                    "set_name": card.get("set_name"),
-                    "set_code": card.get("set", "").upper(),
-                    "collector_number": card.get("collector_number"),
-                    "rarity": card.get("rarity"),
-                    "released_at": card.get("released_at", "")[:4] if card.get("released_at") else ""
-                })
-                
-                # Rate Limit
-                time.sleep(0.05)
-                
-            except Exception as e:
-                continue
+        
+        # pHashes aller neu geladenen Drucke in einem Batch berechnen
+        new_features = {}
+        if downloaded:
+            batch = np.stack([pixels for _, _, pixels, _ in downloaded])
+            ref_hashes = CardMatcher.hash_pixel_batch(batch)
+            
+            for (card, image_url, _, ref_hist), ref_hash in zip(downloaded, ref_hashes):
+                if card.get("id"):
+                    new_features[card["id"]] = (ref_hash, ref_hist)
+                add_candidate(card, image_url, ref_hash, ref_hist)
+        
+        cache.put_many(new_features)
+        
+        if not candidates:
+            return []
+        
+        # Erster Durchgang: Hash-Ähnlichkeit aller Kandidaten vektorisiert
+        hash_scores = CardMatcher.compare_hash_batch(user_hash, [c[2] for c in candidates])
+        
+        # Zweiter Durchgang in Reihenfolge der Hash-Ähnlichkeit: sobald selbst
+        # perfekte Farben (1.0) den top_k-besten Score nicht mehr erreichen,
+        # kann kein weiterer Kandidat unter die angezeigten Ergebnisse kommen.
+        top_scores = []  # Min-Heap der top_k besten Gesamtscores
+        
+        for index in np.argsort(-hash_scores, kind="stable"):
+            card, image_url, _, ref_hist = candidates[index]
+            hash_similarity = float(hash_scores[index])
+            if len(top_scores) >= top_k and (hash_similarity * 0.7) + 0.3 < top_scores[0]:
+                break
+            
+            color_similarity = CardMatcher.compare_histograms(user_hist, ref_hist)
+            
+            # Gesamtscore (gewichtet)
+            total_score = (hash_similarity * 0.7) + (color_similarity * 0.3)
+            if len(top_scores) < top_k:
+                heapq.heappush(top_scores, total_score)
+            else:
+                heapq.heappushpop(top_scores, total_score)
+            
+            results.append({
+                "card": card,
+                "score": total_score,
+                "hash_score": hash_similarity,
+                "color_score": color_similarity,
+                "name": card.get("name"),
+                "set_name": card.get("set_name"),
+                "set_code": card.get("set", "").upper(),
+                "collector_number": card.get("collector_number"),
+                "rarity": card.get("rarity"),
+                "released_at": card.get("released_at", "")[:4] if card.get("released_at") else "",
+                "image_url": image_url
+            })
         
         # Nach Score sortieren
         results.sort(key=lambda x: x["score"], reverse=True)
@@ -473,7 +852,7 @@ class MTGCardScanner:
                 progress_callback(0.6, "Vergleiche Artwork-Versionen...")
             
             artwork = regions.get('artwork')
-            if artwork:
+            if artwork is not None:
                 def version_progress(p):
                     if progress_callback:
                         progress_callback(0.6 + p * 0.35, f"Vergleiche Versionen... {int(p*100)}%")
@@ -481,7 +860,8 @@ class MTGCardScanner:
                 matches = self.matcher.find_best_version_match(
                     artwork, 
                     result["card_name"],
-                    progress_callback=version_progress
+                    progress_callback=version_progress,
+                    oracle_id=card.get("oracle_id")
                 )
                 
                 if matches:
@@ -510,7 +890,7 @@ class MTGCardScanner:
         
         return result
     
-    def _extract_collector_info(self, info_image: Optional[Image.Image]) -> Dict:
+    def _extract_collector_info(self, info_image: Optional[np.ndarray]) -> Dict:
         """Extrahiert Set-Code und Sammlernummer aus dem Info-Bereich"""
         result = {"set_code": None, "number": None}
         
@@ -526,7 +906,7 @@ class MTGCardScanner:
         
         return result
     
-    def _recognize_card_name(self, title_image: Optional[Image.Image], 
+    def _recognize_card_name(self, title_image: Optional[np.ndarray], 
                             full_image: Image.Image) -> Optional[str]:
         """Versucht den Kartennamen zu erkennen"""
         
@@ -552,6 +932,115 @@ def get_card_image_url(card: Dict, size: str = "normal") -> Optional[str]:
     return None
 
 
+@st.cache_resource(ttl=86400, show_spinner=False)
+def _card_name_index() -> Tuple[List[str], List[str]]:
+    """
+    Lädt alle Kartennamen einmalig (Scryfall-Katalog, ~1 MB) als sortierten Index
+    
+    Returns:
+        Tuple aus (Namen, kleingeschriebene Namen), gleich sortiert für bisect
+    """
+    response = _http().get(_URL_CARD_NAMES, timeout=15)
+    response.raise_for_status()
+    names = sorted(_json(response).get("data", []), key=str.lower)
+    return names, [name.lower() for name in names]
+
+
+def get_name_suggestions(query: str, limit: int = 10) -> List[str]:
+    """
+    Namensvorschläge für die Eingabefelder
+    
+    Die Eingabe wird normalisiert (Leerzeichen, Groß-/Kleinschreibung), damit
+    gleichwertige Eingaben denselben Cache-Eintrag treffen. Unter 3 Zeichen
+    sind die Vorschläge zu unspezifisch und es wird kein Request gesendet.
+    Präfix-Treffer kommen per bisect aus dem lokalen Namensindex, erst ohne
+    Treffer (Tippfehler, Wortanfang mitten im Namen) wird Scryfall gefragt.
+    """
+    query = " ".join(query.split()).lower()
+    if len(query) < 3:
+        return []
+    
+    try:
+        names, lowered = _card_name_index()
+    except (requests.RequestException, ValueError):
+        # Fehlschläge werden nicht gecacht - nächster Aufruf versucht es erneut
+        names, lowered = [], []
+    
+    suggestions = []
+    start = bisect_left(lowered, query)
+    for name, lower in zip(names[start:start + limit], lowered[start:start + limit]):
+        if not lower.startswith(query):
+            break
+        suggestions.append(name)
+    
+    if suggestions:
+        return suggestions
+    return ScryfallAPI.autocomplete(query)[:limit]
+
+
+def upload_digest(data: bytes) -> str:
+    """
+    Inhaltsschlüssel eines Uploads (BLAKE2b, 128 Bit)
+    
+    Dieselben Bytes ergeben denselben Schlüssel, auch bei erneutem Upload
+    unter anderem Dateinamen.
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def load_uploaded_image(digest: str, _data: bytes) -> Image.Image:
+    """
+    Dekodiert ein hochgeladenes Bild einmal pro Upload
+    
+    Jede Eingabe löst einen Rerun des Skripts aus; ohne Cache würde das
+    Bild dabei jedes Mal neu dekodiert. Das Ergebnis nur lesen, nicht verändern.
+    Gecacht wird nur über den Digest (siehe upload_digest); _data geht wegen
+    des Unterstrichs nicht in den Schlüssel ein und wird nicht erneut gehasht.
+    """
+    image = Image.open(io.BytesIO(_data))
+    image.load()
+    return image
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_region_previews(digest: str, _data: bytes) -> Dict[str, bytes]:
+    """
+    Titel- und Artwork-Ausschnitt eines Uploads als PNG-Bytes
+    
+    Einmal pro Upload zugeschnitten und kodiert; st.image liefert fertige
+    Bytes unverändert aus, statt das Array bei jedem Rerun neu zu kodieren.
+    """
+    regions = OCREngine.extract_card_regions(load_uploaded_image(digest, _data))
+    previews = {}
+    for key in ('title', 'artwork'):
+        region = regions.get(key)
+        if region is not None and region.size:
+            buffer = io.BytesIO()
+            to_pil_image(region).save(buffer, format="PNG")
+            previews[key] = buffer.getvalue()
+    return previews
+
+
+@st.cache_resource(ttl=3600, max_entries=256, show_spinner=False)
+def get_print_columns(card_name: str,
+                      oracle_id: Optional[str] = None) -> Tuple[List[Dict], np.ndarray, np.ndarray]:
+    """
+    Alle Versionen samt Erscheinungsjahr und Seltenheit als NumPy-Spalten
+    
+    Liste und Spalten stammen aus demselben Abruf und sind daher gleich
+    indiziert; die Filter-Widgets maskieren bei jedem Rerun nur noch diese
+    Arrays. Versionen ohne Erscheinungsdatum erhalten das Jahr 0.
+    """
+    versions = ScryfallAPI.get_all_prints(card_name, oracle_id)
+    years = np.array(
+        [int(v["released_at"][:4]) if v.get("released_at") else 0 for v in versions],
+        dtype=np.int16
+    )
+    rarities = np.array([v.get("rarity", "") for v in versions], dtype=str)
+    return versions, years, rarities
+
+
 def format_price(prices: Dict) -> str:
     """Formatiert Preisangaben"""
     usd = prices.get("usd")
@@ -588,6 +1077,32 @@ def get_confidence_class(confidence: float) -> str:
     return "confidence-low"
 
 
+def render_image_grid(tiles: List[Tuple[str, str]], columns: int = 5):
+    """
+    Rendert Kartenbilder als ein einziges HTML-Grid
+    
+    Der Browser lädt die Bilder direkt und parallel vom Scryfall-CDN statt
+    einzeln über st.image; loading="lazy" verschiebt nicht sichtbare Bilder.
+    
+    Args:
+        tiles: Liste von (Bild-URL oder None, Beschriftung als HTML; eingesetzte
+               Werte müssen bereits mit html.escape maskiert sein)
+        columns: Anzahl der Spalten
+    """
+    cells = "".join(
+        '<div style="text-align: center; font-size: 0.8rem;">'
+        + (f'<img loading="lazy" src="{html.escape(url, quote=True)}" '
+           'style="width: 100%; border-radius: 4%;">' if url else '')
+        + f'{caption}</div>'
+        for url, caption in tiles
+    )
+    st.markdown(
+        f'<div style="display: grid; grid-template-columns: repeat({columns}, 1fr); gap: 8px;">'
+        f'{cells}</div>',
+        unsafe_allow_html=True
+    )
+
+
 def display_scan_result(result: Dict):
     """Zeigt das Scan-Ergebnis an"""
     if not result.get("success"):
@@ -678,22 +1193,22 @@ def display_card(card: Dict, all_matches: List[Dict] = None):
         st.markdown("---")
         st.markdown("### 🔄 Alternative Versionen (nach Übereinstimmung)")
         
-        # Als Galerie
-        cols = st.columns(5)
-        for i, match in enumerate(all_matches[1:11]):  # Top 10 Alternativen
-            with cols[i % 5]:
-                img_url = get_card_image_url(match.get("card", {}), "small")
-                if img_url:
-                    st.image(img_url, use_container_width=True)
-                    st.markdown(f"""
-                    <div style="text-align: center; font-size: 0.8rem;">
-                        <b>{match['set_code']}</b> #{match['collector_number']}<br>
-                        <span class="match-score">{match['score']*100:.0f}%</span>
-                    </div>
-                    """, unsafe_allow_html=True)
-
-
-def display_version_selection(card_name: str, user_image: Image.Image):
+        # Als Galerie (Top 10 Alternativen)
+        tiles = []
+        for match in all_matches[1:11]:
+            img_url = match.get("image_url") or get_card_image_url(match.get("card", {}), "small")
+            if img_url:
+                tiles.append((
+                    img_url,
+                    f"<b>{html.escape(str(match['set_code']))}</b> "
+                    f"#{html.escape(str(match['collector_number']))}<br>"
+                    f"<span class=\"match-score\">{match['score']*100:.0f}%</span>"
+                ))
+        render_image_grid(tiles, columns=5)
+
+
+def display_version_selection(card_name: str, user_image: Image.Image,
+                              oracle_id: Optional[str] = None):
     """Zeigt Versionserkennung mit Bildvergleich"""
     
     st.markdown("### 🔍 Suche passende Version...")
@@ -702,7 +1217,7 @@ def display_version_selection(card_name: str, user_image: Image.Image):
     regions = OCREngine.extract_card_regions(user_image)
     user_artwork = regions.get('artwork')
     
-    if not user_artwork:
+    if user_artwork is None:
         st.error("Konnte Artwork nicht extrahieren")
         return
     
@@ -717,7 +1232,8 @@ def display_version_selection(card_name: str, user_image: Image.Image):
     matches = CardMatcher.find_best_version_match(
         user_artwork, 
         card_name,
-        progress_callback=update_progress
+        progress_callback=update_progress,
+        oracle_id=oracle_id
     )
     
     progress_bar.progress(1.0)
@@ -787,7 +1303,9 @@ def main():
         )
         
         if uploaded_file:
-            image = Image.open(uploaded_file)
+            upload_data = uploaded_file.getvalue()
+            upload_key = upload_digest(upload_data)
+            image = load_uploaded_image(upload_key, upload_data)
             
             col1, col2 = st.columns([1, 1])
             
@@ -798,16 +1316,16 @@ def main():
             with col2:
                 st.markdown("#### 🔍 Erkannte Bereiche")
                 
-                # Regionen extrahieren und anzeigen
-                regions = OCREngine.extract_card_regions(image)
+                # Regionen extrahieren und anzeigen (gecacht pro Upload)
+                previews = get_region_previews(upload_key, upload_data)
                 
                 region_col1, region_col2 = st.columns(2)
                 with region_col1:
-                    if regions.get('title'):
-                        st.image(regions['title'], caption="Titelbereich", use_container_width=True)
+                    if previews.get('title') is not None:
+                        st.image(previews['title'], caption="Titelbereich", use_container_width=True)
                 with region_col2:
-                    if regions.get('artwork'):
-                        st.image(regions['artwork'], caption="Artwork", use_container_width=True)
+                    if previews.get('artwork') is not None:
+                        st.image(previews['artwork'], caption="Artwork", use_container_width=True)
             
             st.markdown("---")
             
@@ -821,25 +1339,27 @@ def main():
             )
             
             # Autovervollständigung
-            if card_name_input and len(card_name_input) >= 2:
-                suggestions = ScryfallAPI.autocomplete(card_name_input)
+            from_suggestion = False
+            if card_name_input:
+                suggestions = get_name_suggestions(card_name_input)
                 if suggestions:
                     selected = st.selectbox(
                         "Vorschläge:",
-                        [""] + suggestions[:10]
+                        [""] + suggestions
                     )
                     if selected:
                         card_name_input = selected
+                        from_suggestion = True
             
             if card_name_input and st.button("🔎 Version finden", type="primary"):
                 # Karte verifizieren
-                card = ScryfallAPI.search_card(card_name_input)
+                card = ScryfallAPI.find_card(card_name_input, exact=from_suggestion)
                 if card:
                     verified_name = card.get("name")
                     st.success(f"✓ Karte gefunden: **{verified_name}**")
                     
                     # Versionsvergleich starten
-                    display_version_selection(verified_name, image)
+                    display_version_selection(verified_name, image, card.get("oracle_id"))
                 else:
                     st.error(f"Karte '{card_name_input}' nicht gefunden")
     
@@ -851,20 +1371,22 @@ def main():
             placeholder="z.B. Lightning Bolt"
         )
         
-        if card_name and len(card_name) >= 2:
-            suggestions = ScryfallAPI.autocomplete(card_name)
+        from_suggestion = False
+        if card_name:
+            suggestions = get_name_suggestions(card_name)
             if suggestions:
-                selected = st.selectbox("Vorschläge:", [""] + suggestions[:10])
+                selected = st.selectbox("Vorschläge:", [""] + suggestions)
                 if selected:
                     card_name = selected
+                    from_suggestion = True
         
         if card_name:
-            card = ScryfallAPI.search_card(card_name)
+            card = ScryfallAPI.find_card(card_name, exact=from_suggestion)
             if card:
                 st.success(f"✓ **{card.get('name')}** gefunden")
                 
                 # Alle Versionen laden
-                versions = ScryfallAPI.get_all_prints(card.get("name"))
+                versions, years, rarities = get_print_columns(card.get("name"), card.get("oracle_id"))
                 
                 if versions:
                     st.markdown(f"### 📚 {len(versions)} Versionen verfügbar")
@@ -883,33 +1405,29 @@ def main():
                             1993, 2025, (1993, 2025)
                         )
                     
-                    # Filtern
-                    filtered = versions
+                    # Filtern (Maske über die gecachten Spalten)
+                    mask = (years >= year_filter[0]) & (years <= year_filter[1])
                     if rarity_filter:
-                        filtered = [v for v in filtered if v.get("rarity") in rarity_filter]
-                    
-                    filtered = [v for v in filtered 
-                               if v.get("released_at") and 
-                               year_filter[0] <= int(v["released_at"][:4]) <= year_filter[1]]
+                        mask &= np.isin(rarities, rarity_filter)
+                    filtered = [versions[i] for i in np.flatnonzero(mask)]
                     
                     # Anzeigen
                     st.markdown(f"**{len(filtered)} Versionen angezeigt**")
                     
-                    cols = st.columns(4)
-                    for i, v in enumerate(filtered[:20]):
-                        with cols[i % 4]:
-                            img_url = get_card_image_url(v, "normal")
-                            if img_url:
-                                st.image(img_url, use_container_width=True)
-                            st.markdown(f"""
-                            **{v.get('set_name', '')}**  
-                            `{v.get('set', '').upper()}` #{v.get('collector_number', '')}  
-                            {v.get('released_at', '')[:4]}
-                            """)
-                            
-                            # Preis
-                            price = v.get('prices', {}).get('usd', 'N/A')
-                            st.markdown(f"💰 ${price}")
+                    # Ein einziges HTML-Grid statt drei Elementen pro Kachel;
+                    # Thumbnail-Größe reicht für das 4-Spalten-Raster
+                    tiles = []
+                    for v in filtered[:20]:
+                        price = v.get('prices', {}).get('usd', 'N/A')
+                        tiles.append((
+                            get_card_image_url(v, "small"),
+                            f"<b>{html.escape(v.get('set_name', ''))}</b><br>"
+                            f"<code>{html.escape(v.get('set', '').upper())}</code> "
+                            f"#{html.escape(v.get('collector_number', ''))}<br>"
+                            f"{html.escape(v.get('released_at', '')[:4])}<br>"
+                            f"💰 ${html.escape(str(price))}"
+                        ))
+                    render_image_grid(tiles, columns=4)
     
     elif scan_mode == "🎲 Zufällige Karte":
         st.markdown("### 🎲 Zufällige Karte")
@@ -7,6 +7,7 @@ Verwendung:
     python main.py --webcam
     python main.py --name "Lightning Bolt"
     python main.py --batch folder/with/cards/
+    python main.py --batch folder/with/cards/ --bulk
 """
 
 import argparse
@@ -64,6 +65,19 @@ def main():
         type=str,
         help="Pfad zur Tesseract-Executable"
     )
+    parser.add_argument(
+        "--bulk",
+        nargs="?",
+        const=True,
+        default=False,
+        metavar="DATEI",
+        help="Scryfall-Bulk-Daten vorab laden (ohne DATEI: aktuelle default_cards)"
+    )
+    parser.add_argument(
+        "--opencl",
+        action="store_true",
+        help="Bildvorverarbeitung per OpenCL auf der GPU (falls verfügbar)"
+    )
     parser.add_argument(
         "--verbose", "-v",
         action="store_true",
@@ -82,7 +96,11 @@ def main():
     
     # Recognizer initialisieren
     try:
-        recognizer = MTGCardRecognizer(tesseract_path=args.tesseract_path)
+        recognizer = MTGCardRecognizer(
+            tesseract_path=args.tesseract_path,
+            bulk=args.bulk,
+            use_opencl=args.opencl
+        )
     except Exception as e:
         print(f"Fehler bei der Initialisierung: {e}")
         sys.exit(1)
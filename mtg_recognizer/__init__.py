@@ -1,12 +1,11 @@
 """
 MTG Card Recognition Package
+
+Die Klassen werden erst beim ersten Zugriff importiert (PEP 562), damit
+"import mtg_recognizer" nicht sofort OpenCV, NumPy und pytesseract lädt.
 """
 
-from .recognizer import MTGCardRecognizer
-from .scryfall_api import ScryfallAPI
-from .image_processor import ImageProcessor
-from .ocr_engine import OCREngine
-from .card_matcher import CardMatcher
+from importlib import import_module
 
 __version__ = "1.0.0"
 __all__ = [
@@ -14,5 +13,31 @@ __all__ = [
     "ScryfallAPI", 
     "ImageProcessor",
     "OCREngine",
-    "CardMatcher"
+    "CardMatcher",
+    "CardNameIndex"
 ]
+
+# Öffentlicher Name -> Modul, das ihn definiert
+_LAZY_IMPORTS = {
+    "MTGCardRecognizer": ".recognizer",
+    "ScryfallAPI": ".scryfall_api",
+    "ImageProcessor": ".image_processor",
+    "OCREngine": ".ocr_engine",
+    "CardMatcher": ".card_matcher",
+    "CardNameIndex": ".name_index",
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    
+    value = getattr(import_module(module_name, __name__), name)
+    # Im Modul ablegen, spätere Zugriffe laufen nicht mehr über __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,197 @@
+"""
+Persistenter Cache für MTG Kartenerkennung
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+# Abgelaufene Einträge werden beim Öffnen und danach höchstens so oft entfernt
+PURGE_INTERVAL = 3600
+# So lange bleiben abgelaufene Einträge für get_stale (bedingte Requests) erhalten
+STALE_GRACE = 7 * 86400
+
+
+def default_cache_dir() -> str:
+    """
+    Ermittelt das Cache-Verzeichnis des Pakets
+    
+    Returns:
+        $XDG_CACHE_HOME/mtg_recognizer bzw. ~/.cache/mtg_recognizer
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "mtg_recognizer")
+
+
+class DiskCache:
+    """
+    Schlüssel-Wert-Speicher auf SQLite-Basis mit optionalem Ablaufdatum
+    
+    Werte werden gepickelt abgelegt. Mehrere Caches teilen sich eine Datei
+    und werden über den Namespace getrennt. Einträge, die seit mehr als
+    STALE_GRACE abgelaufen sind, werden beim Öffnen und danach spätestens
+    alle PURGE_INTERVAL Sekunden gelöscht, damit die Datei nicht unbegrenzt
+    wächst. Ist das Verzeichnis nicht
+    beschreibbar, wird auf eine In-Memory-Datenbank ausgewichen.
+    """
+    
+    def __init__(self, namespace: str = "default", path: Optional[str] = None):
+        """
+        Initialisiert den Cache
+        
+        Args:
+            namespace: Trennt unabhängige Caches in derselben Datei
+            path: Pfad zur SQLite-Datei (Standard: default_cache_dir()/cache.db)
+        """
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        
+        if path is None:
+            path = os.path.join(default_cache_dir(), "cache.db")
+        
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._create_table()
+        except (OSError, sqlite3.Error) as e:
+            print(f"Cache nicht verfügbar ({e}), nutze Arbeitsspeicher")
+            self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+            self._create_table()
+        
+        self.purge_expired()
+    
+    def _create_table(self):
+        """Legt die Cache-Tabelle an"""
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, "
+            "expires REAL, PRIMARY KEY (namespace, key))"
+        )
+        self._conn.commit()
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        """
+        Liest einen Wert
+        
+        Args:
+            key: Schlüssel
+            default: Rückgabe bei fehlendem oder abgelaufenem Eintrag
+        
+        Returns:
+            Gespeicherter Wert oder default
+        """
+        row = self._read(key)
+        if row is None:
+            return default
+        
+        value, expires = row
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return default
+        
+        try:
+            return pickle.loads(value)
+        except Exception:
+            return default
+    
+    def get_stale(self, key: str, default: Any = None) -> Tuple[Any, bool]:
+        """
+        Liest einen Wert auch nach Ablauf (z.B. für bedingte HTTP-Requests)
+        
+        Abgelaufene Einträge bleiben höchstens STALE_GRACE Sekunden über ihr
+        Ablaufdatum hinaus erhalten, ältere gelten als fehlend.
+        
+        Args:
+            key: Schlüssel
+            default: Rückgabe bei fehlendem Eintrag
+        
+        Returns:
+            Tuple aus (Wert oder default, noch gültig)
+        """
+        row = self._read(key)
+        if row is None:
+            return default, False
+        
+        value, expires = row
+        now = time.time()
+        if expires is not None and expires < now - STALE_GRACE:
+            return default, False
+        try:
+            value = pickle.loads(value)
+        except Exception:
+            return default, False
+        return value, expires is None or expires >= now
+    
+    def _read(self, key: str) -> Optional[Tuple[bytes, Optional[float]]]:
+        """Liest (Blob, Ablaufzeit) eines Eintrags"""
+        with self._lock:
+            try:
+                return self._conn.execute(
+                    "SELECT value, expires FROM cache WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                ).fetchone()
+            except sqlite3.Error:
+                return None
+    
+    def set(self, key: str, value: Any, expire: Optional[float] = None):
+        """
+        Speichert einen Wert
+        
+        Args:
+            key: Schlüssel
+            value: Beliebiges pickelbares Objekt
+            expire: Lebensdauer in Sekunden (None = unbegrenzt)
+        """
+        now = time.time()
+        if now - self._last_purge > PURGE_INTERVAL:
+            self.purge_expired()
+        
+        expires = now + expire if expire is not None else None
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO cache (namespace, key, value, expires) "
+                    "VALUES (?, ?, ?, ?)",
+                    (self.namespace, key, blob, expires)
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Cache-Schreibfehler: {e}")
+    
+    def delete(self, key: str):
+        """Entfernt einen Eintrag"""
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                )
+                self._conn.commit()
+            except sqlite3.Error:
+                pass
+    
+    def purge_expired(self):
+        """Löscht Einträge aller Namespaces, die seit mehr als STALE_GRACE abgelaufen sind"""
+        now = time.time()
+        with self._lock:
+            self._last_purge = now
+            try:
+                self._conn.execute("DELETE FROM cache WHERE expires < ?", (now - STALE_GRACE,))
+                self._conn.commit()
+            except sqlite3.Error:
+                pass
+    
+    def clear(self):
+        """Leert alle Einträge dieses Namespace"""
+        with self._lock:
+            try:
+                self._conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+                self._conn.commit()
+            except sqlite3.Error:
+                pass
@@ -3,33 +3,250 @@ Kartenabgleich und Versionserkennung für MTG Karten
 """
 
 import cv2
+import gzip
+import json
+import math
+import os
+import pickle
+import time
 import numpy as np
-from typing import Optional, List, Dict, Tuple
+from typing import Optional, List, Dict, Sequence, Tuple
+from dataclasses import dataclass
+from itertools import combinations
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import imagehash
-from PIL import Image
 import io
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from .scryfall_api import ScryfallAPI
-from .image_processor import ImageProcessor
+from .image_processor import ImageProcessor, compute_phash, hamming_distances
+from .cache import DiskCache, default_cache_dir
+
+# Referenz-Hashes ändern sich nur mit neuen Scans bei Scryfall
+HASH_CACHE_EXPIRE = 12 * 7 * 86400  # 12 Wochen
+# Parallele Referenz-Downloads (Bild-CDN von Scryfall ist nicht ratenbegrenzt)
+DOWNLOAD_WORKERS = 8
+# Gewichte der Score-Komponenten
+ART_WEIGHT = 0.6
+COLOR_WEIGHT = 0.2
+FRAME_WEIGHT = 0.2
+# Scryfall erneuert die Bulk-Dateien täglich
+BULK_EXPIRE = 24 * 3600
+# Keine spielbaren Karten: Art-Series-Karten tragen echte Kartennamen
+_NON_GAME_LAYOUTS = frozenset({"art_series", "token", "double_faced_token", "emblem"})
+# Ab diesem Artwork-Score (höchstens 1 Bit Differenz) gilt die Version als gefunden
+EARLY_STOP_ART_SCORE = 0.97
+# Score einer eindeutig über eine sichere Sammlernummer gefundenen Version
+COLLECTOR_NUMBER_SCORE = 0.95
+
+
+# MTG Farben zu RGB (vereinfacht)
+# (Tupel statt Arrays: für 3 Werte ist skalare Arithmetik schneller als NumPy)
+_MTG_COLORS = {
+    "W": (240.0, 230.0, 210.0),  # Weiß
+    "U": (50.0, 100.0, 180.0),   # Blau
+    "B": (50.0, 50.0, 60.0),     # Schwarz
+    "R": (180.0, 70.0, 50.0),    # Rot
+    "G": (50.0, 140.0, 80.0),    # Grün
+}
+_COLORLESS_FRAME = (150.0, 150.0, 150.0)  # Farblos/Artefakt
+_GOLD_FRAME = (200.0, 170.0, 80.0)        # Mehrfarbig
+# Ab dieser Farbdifferenz ist der Farb-Score 0
+_MAX_COLOR_DIFF = 200.0
+
+
+def _expected_frame_color(identity: frozenset) -> Tuple[float, float, float]:
+    """Erwartete Rahmenfarbe einer Farbidentität"""
+    if not identity:
+        return _COLORLESS_FRAME
+    if len(identity) == 1:
+        return _MTG_COLORS[next(iter(identity))]
+    return _GOLD_FRAME
+
+
+# Alle 32 Farbidentitäten, einmal beim Import berechnet
+EXPECTED_FRAME_COLORS = {
+    frozenset(combo): _expected_frame_color(frozenset(combo))
+    for size in range(len(_MTG_COLORS) + 1)
+    for combo in combinations(_MTG_COLORS, size)
+}
+
+
+@dataclass
+class UserImageFeatures:
+    """Merkmale des Benutzerbilds, einmal pro Abgleich berechnet"""
+    art_hash: Optional[int]
+    border_rgb_mean: Tuple[float, float, float]  # Durchschnittsfarbe linker/rechter Rand (RGB)
+    top_border_mean: float       # Durchschnittshelligkeit oberer Rand
+    has_black_border: bool
+
+
+def _normalize_collector_number(collector_number: str) -> str:
+    """Sammlernummer ohne Gesamtzahl und führende Nullen ("007/250" -> "7")"""
+    return collector_number.split("/")[0].lstrip("0")
+
+
+def _illustration_id(card: Dict) -> Optional[str]:
+    """Scryfall-ID des Artworks (bei doppelseitigen Karten der Vorderseite)"""
+    faces = card.get("card_faces") or ()
+    return card.get("illustration_id") or (faces[0].get("illustration_id") if faces else None)
+
+
+class _PrintTable:
+    """
+    Spaltenweise Sicht auf alle Versionen einer Karte (Structure of Arrays)
+    
+    Filter laufen als NumPy-Masken über die Spalten statt als Schleifen über
+    die Dicts; die Sammlernummern sind zusätzlich als Dict indiziert.
+    """
+    
+    def __init__(self, prints: List[Dict]):
+        """
+        Args:
+            prints: Versionen in Scryfall-Reihenfolge
+        """
+        self.prints = prints
+        self.rarities = np.array([c.get("rarity", "") for c in prints], dtype=str)
+        self.set_codes = np.array([c.get("set", "").lower() for c in prints], dtype=str)
+        numbers = [c.get("collector_number", "") for c in prints]
+        numbers_clean = [_normalize_collector_number(n) for n in numbers]
+        self.collector_numbers_clean = np.array(numbers_clean, dtype=str)
+        
+        # Bei gleicher Nummer gewinnt wie bisher die erste Version
+        self.by_number = {}
+        self.by_number_clean = {}
+        for card, number, number_clean in zip(prints, numbers, numbers_clean):
+            self.by_number.setdefault(number, card)
+            self.by_number_clean.setdefault(number_clean, card)
+    
+    def select(self, mask: np.ndarray) -> List[Dict]:
+        """Versionen, deren Maskeneintrag gesetzt ist"""
+        return [self.prints[i] for i in np.flatnonzero(mask)]
 
 
 class CardMatcher:
     """Matching-Engine für MTG Kartenerkennung und Versionsidentifikation"""
     
-    def __init__(self, api: Optional[ScryfallAPI] = None):
+    def __init__(self, api: Optional[ScryfallAPI] = None,
+                 hash_cache: Optional[DiskCache] = None):
         """
         Initialisiert den CardMatcher
         
         Args:
             api: Optionale ScryfallAPI Instanz
+            hash_cache: Optionaler persistenter Cache für Referenz-Hashes
         """
         self.api = api or ScryfallAPI()
         self.processor = ImageProcessor()
         self._image_cache = {}
+        self._print_tables = {}
+        self._hash_cache = hash_cache if hash_cache is not None else DiskCache("phash")
+    
+    def load_bulk(self, path_or_url: Optional[str] = None,
+                  cache_path: Optional[str] = None) -> int:
+        """
+        Lädt alle Druckversionen aus Scryfalls Bulk-Daten ("default_cards")
+        
+        Danach beantwortet get_all_prints bekannte Namen ohne API-Aufruf.
+        Die nach Namen gruppierten Daten werden komprimiert auf der Festplatte
+        abgelegt und 24 Stunden wiederverwendet.
+        
+        Args:
+            path_or_url: Lokale JSON-Datei oder Download-URL
+                         (Standard: aktuelle default_cards von Scryfall)
+            cache_path: Ablageort (Standard: default_cache_dir()/bulk_v2.pkl.gz)
+        
+        Returns:
+            Anzahl der geladenen Kartennamen (0 bei Fehlern)
+        """
+        if cache_path is None:
+            cache_path = os.path.join(default_cache_dir(), "bulk_v2.pkl.gz")
+        
+        prints_by_name = None
+        if path_or_url is None:
+            prints_by_name = self._read_bulk_cache(cache_path)
+        
+        if prints_by_name is None:
+            cards = self._read_bulk_source(path_or_url)
+            if not cards:
+                return 0
+            prints_by_name = self._group_by_name(cards)
+            self._write_bulk_cache(cache_path, prints_by_name)
+        
+        self.api.add_prints(prints_by_name)
+        self._print_tables.clear()
+        return len(prints_by_name)
+    
+    def _read_bulk_source(self, path_or_url: Optional[str]) -> List[Dict]:
+        """Liest die Bulk-JSON aus einer Datei oder lädt sie herunter"""
+        if path_or_url and os.path.isfile(path_or_url):
+            try:
+                with open(path_or_url, "rb") as f:
+                    return orjson.loads(f.read()) if orjson is not None else json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Fehler beim Lesen der Bulk-Datei: {e}")
+                return []
+        
+        if path_or_url is None:
+            info = self.api.get_bulk_data_info("default_cards")
+            path_or_url = info.get("download_uri") if info else None
+            if not path_or_url:
+                return []
+        
+        return self.api.download_bulk_data(path_or_url)
+    
+    @staticmethod
+    def _group_by_name(cards: List[Dict]) -> Dict[str, List[Dict]]:
+        """
+        Gruppiert Karten nach Namen, neueste Version zuerst
+        
+        Doppelseitige Karten sind zusätzlich unter jedem Seitennamen erreichbar.
+        Art-Series-Karten, Tokens und Emblems werden übersprungen, damit die
+        lokalen Ergebnisse denen der API entsprechen.
+        """
+        cards = sorted(cards, key=lambda c: c.get("released_at") or "", reverse=True)
+        prints_by_name: Dict[str, List[Dict]] = {}
+        
+        for card in cards:
+            name = card.get("name")
+            if not name or card.get("layout") in _NON_GAME_LAYOUTS:
+                continue
+            prints_by_name.setdefault(name, []).append(card)
+            for face in card.get("card_faces") or ():
+                face_name = face.get("name")
+                if face_name and face_name != name:
+                    prints_by_name.setdefault(face_name, []).append(card)
+        
+        return prints_by_name
+    
+    @staticmethod
+    def _read_bulk_cache(cache_path: str) -> Optional[Dict[str, List[Dict]]]:
+        """Liest die gespeicherten Bulk-Daten, falls jünger als BULK_EXPIRE"""
+        try:
+            if time.time() - os.path.getmtime(cache_path) > BULK_EXPIRE:
+                return None
+            with gzip.open(cache_path, "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            return None
+    
+    @staticmethod
+    def _write_bulk_cache(cache_path: str, prints_by_name: Dict[str, List[Dict]]):
+        """Speichert die gruppierten Bulk-Daten (erst temporär, dann umbenennen)"""
+        tmp_path = cache_path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            with gzip.open(tmp_path, "wb", compresslevel=3) as f:
+                pickle.dump(prints_by_name, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"Bulk-Cache nicht gespeichert: {e}")
     
     def find_best_match(self, card_name: str, card_image: np.ndarray, 
-                       top_k: int = 5) -> List[Dict]:
+                       top_k: int = 5, hints: Optional[Dict] = None,
+                       gray: Optional[np.ndarray] = None) -> List[Dict]:
         """
         Findet die beste Übereinstimmung für eine Karte
         
@@ -37,130 +254,340 @@ class CardMatcher:
             card_name: Erkannter Kartenname
             card_image: Bild der zu identifizierenden Karte
             top_k: Anzahl der Top-Ergebnisse
+            hints: Optionale Metadaten aus der OCR ("collector_number",
+                   "set", "rarity"). Nur mit "number_trusted" (Sammlernummer
+                   über der Konfidenzschwelle) grenzen sie die Kandidaten ein
+                   und ein eindeutiger Treffer ersetzt den Bildvergleich;
+                   sonst werden passende Versionen nur zuerst verglichen
+            gray: Optional bereits vorhandene Graustufenversion von card_image
+                  (z.B. aus extract_card_and_gray), spart die Umrechnung
         
         Returns:
             Liste der besten Übereinstimmungen mit Scores
         """
         # Alle Versionen der Karte abrufen
-        all_prints = self.api.get_all_prints(card_name)
+        table = self._get_print_table(card_name)
+        all_prints = table.prints
         
         if not all_prints:
             return []
         
-        # Artwork-Region extrahieren
-        card_art = self.processor.extract_art_region(card_image)
-        card_art_hash = self._compute_phash(card_art)
-        
-        # Scores für alle Versionen berechnen
-        results = []
-        
-        for card in all_prints:
-            score = self._calculate_match_score(card, card_image, card_art_hash)
-            results.append({
-                "card": card,
-                "score": score,
-                "name": card.get("name", "Unknown"),
-                "set_name": card.get("set_name", "Unknown"),
-                "set_code": card.get("set", "???"),
-                "collector_number": card.get("collector_number", ""),
-                "rarity": card.get("rarity", "common"),
-                "image_url": self.api.get_card_image_url(card)
-            })
+        # Günstiger Pfad zuerst: Metadaten-Hinweise ohne Downloads auswerten
+        candidates = all_prints
+        preferred = ()
+        if hints:
+            matching = self._filter_by_hints(table, hints)
+            trusted = bool(hints.get("number_trusted"))
+            if len(matching) == 1 and hints.get("collector_number") and trusted:
+                result = self._build_result(matching[0], COLLECTOR_NUMBER_SCORE)
+                result["hint_match"] = True
+                return [result]
+            if matching and trusted:
+                candidates = matching
+            else:
+                # Unsichere Hinweise nur als Reihenfolge: passende Versionen
+                # zuerst vergleichen, die übrigen trotzdem bewerten
+                preferred = matching
+        
+        # Merkmale des Benutzerbilds einmal vorab berechnen
+        features = self._compute_user_features(card_image, gray)
+        
+        # Artwork-Scores (mit vorzeitigem Abbruch), danach die übrigen Faktoren
+        candidates, art_scores = self._score_artwork(candidates, features.art_hash, preferred)
+        results = [
+            self._build_result(card, self._calculate_match_score(card, features, art_score))
+            for card, art_score in zip(candidates, art_scores)
+        ]
         
         # Nach Score sortieren
         results.sort(key=lambda x: x["score"], reverse=True)
         
         return results[:top_k]
     
-    def _calculate_match_score(self, card_data: Dict, user_image: np.ndarray,
-                              user_art_hash) -> float:
+    def _compute_user_features(self, user_image: np.ndarray,
+                               gray: Optional[np.ndarray] = None) -> UserImageFeatures:
+        """
+        Berechnet die vom Benutzerbild abhängigen Merkmale
+        
+        Sie sind für alle Versionen einer Karte gleich und werden daher nicht
+        pro Version neu berechnet.
+        
+        Args:
+            user_image: Benutzerbild der Karte (BGR)
+            gray: Optionale Graustufenversion (gleiche Größe) für den Artwork-Hash
+        
+        Returns:
+            UserImageFeatures
+        """
+        height, width = user_image.shape[:2]
+        
+        # Artwork-Hash (der Hash arbeitet ohnehin auf Graustufen)
+        art_source = gray if gray is not None and gray.shape[:2] == (height, width) else user_image
+        art_hash = self._compute_phash(self.processor.extract_art_region(art_source))
+        
+        # Rahmenbereich (links und rechts) - nur Slice-Views, keine Kopie
+        left_border = user_image[:, :int(width*0.05)]
+        right_border = user_image[:, int(width*0.95):]
+        
+        # Durchschnittsfarbe über beide Streifen (Summen statt vstack,
+        # funktioniert auch bei ungleich breiten Streifen); cv2.sumElems
+        # summiert alle Kanäle in einem SIMD-Durchlauf
+        pixel_count = left_border.shape[0] * left_border.shape[1] + right_border.shape[0] * right_border.shape[1]
+        left_sum, right_sum = cv2.sumElems(left_border), cv2.sumElems(right_border)
+        avg_color = [(left_sum[i] + right_sum[i]) / max(pixel_count, 1) for i in range(3)]
+        
+        # BGR zu RGB (Graustufen auf alle drei Kanäle verteilen)
+        if user_image.ndim == 3:
+            border_rgb_mean = (avg_color[2], avg_color[1], avg_color[0])
+        else:
+            border_rgb_mean = (avg_color[0],) * 3
+        
+        # Oberer Rand (Mittel über alle Kanäle)
+        top_border = user_image[:int(height*0.02), :]
+        channels = user_image.shape[2] if user_image.ndim == 3 else 1
+        top_border_mean = sum(cv2.mean(top_border)[:channels]) / channels
+        
+        return UserImageFeatures(
+            art_hash=art_hash,
+            border_rgb_mean=border_rgb_mean,
+            top_border_mean=top_border_mean,
+            has_black_border=top_border_mean < 50
+        )
+    
+    def _build_result(self, card: Dict, score: float) -> Dict:
+        """
+        Erstellt einen Ergebniseintrag für eine Kartenversion
+        
+        Args:
+            card: Kartendaten
+            score: Übereinstimmungsscore
+        
+        Returns:
+            Ergebnis-Dictionary
+        """
+        return {
+            "card": card,
+            "score": score,
+            "name": card.get("name", "Unknown"),
+            "set_name": card.get("set_name", "Unknown"),
+            "set_code": card.get("set", "???"),
+            "collector_number": card.get("collector_number", ""),
+            "rarity": card.get("rarity", "common"),
+            "image_url": self.api.get_card_image_url(card)
+        }
+    
+    def _filter_by_hints(self, table: _PrintTable, hints: Dict) -> List[Dict]:
+        """
+        Schränkt die Versionen anhand von OCR-Metadaten ein (ohne I/O)
+        
+        Args:
+            table: Spaltentabelle aller Versionen einer Karte
+            hints: "collector_number", "set" und/oder "rarity"
+        
+        Returns:
+            Passende Versionen (leer wenn kein Hinweis passt)
+        """
+        set_code = (hints.get("set") or "").lower()
+        rarity = hints.get("rarity")
+        number_clean = _normalize_collector_number(hints.get("collector_number") or "")
+        
+        mask = np.ones(len(table.prints), dtype=bool)
+        if set_code:
+            mask &= table.set_codes == set_code
+        if rarity:
+            mask &= table.rarities == rarity
+        if number_clean:
+            mask &= table.collector_numbers_clean == number_clean
+        
+        return table.select(mask)
+    
+    def _calculate_match_score(self, card_data: Dict,
+                               user_features: UserImageFeatures,
+                               art_score: Optional[float]) -> float:
         """
         Berechnet den Übereinstimmungsscore zwischen Karte und Bild
         
         Args:
             card_data: Kartendaten von Scryfall
-            user_image: Benutzerbild der Karte
-            user_art_hash: Hash des Artwork-Bereichs
+            user_features: Vorab berechnete Merkmale des Benutzerbilds
+            art_score: Artwork-Score (siehe _compare_artwork_batch) oder None
         
         Returns:
             Score (0.0 - 1.0)
         """
-        score_components = []
+        # 3. Rahmen-Erkennung (alter/neuer Rahmen, Vollbild, etc.) - immer vorhanden
+        weighted_sum = FRAME_WEIGHT * self._estimate_frame_match(card_data, user_features)
+        total_weight = FRAME_WEIGHT
         
         # 1. Artwork-Hash-Vergleich (wichtigster Faktor)
-        art_score = self._compare_artwork(card_data, user_art_hash)
         if art_score is not None:
-            score_components.append(("art_hash", art_score, 0.6))
+            weighted_sum += ART_WEIGHT * art_score
+            total_weight += ART_WEIGHT
         
         # 2. Farbschema-Vergleich
-        color_score = self._compare_colors(card_data, user_image)
+        color_score = self._compare_colors(card_data, user_features)
         if color_score is not None:
-            score_components.append(("color", color_score, 0.2))
+            weighted_sum += COLOR_WEIGHT * color_score
+            total_weight += COLOR_WEIGHT
         
-        # 3. Rahmen-Erkennung (alter/neuer Rahmen, Vollbild, etc.)
-        frame_score = self._estimate_frame_match(card_data, user_image)
-        score_components.append(("frame", frame_score, 0.2))
+        # Gewichteter Score, fehlende Faktoren fallen aus der Normierung heraus
+        return weighted_sum / total_weight
+    
+    def _score_artwork(self, cards: List[Dict], user_art_hash: Optional[int],
+                       preferred: Sequence[Dict] = ()) -> Tuple[List[Dict], List[Optional[float]]]:
+        """
+        Berechnet Artwork-Scores blockweise und bricht bei eindeutigem Treffer ab
         
-        # Gewichteter Score
-        if not score_components:
-            return 0.0
+        Die Versionen werden neueste zuerst in Blöcken von DOWNLOAD_WORKERS
+        geladen (parallel) und verglichen. Erreicht ein Block
+        EARLY_STOP_ART_SCORE, entfallen die restlichen Downloads: Versionen
+        mit derselben illustration_id wie ein Treffer übernehmen dessen Score
+        (Rahmen und Farbe unterscheiden sie danach), Versionen mit anderem
+        Artwork fehlen im Ergebnis.
         
-        total_weight = sum(w for _, _, w in score_components)
-        weighted_score = sum(s * w for _, s, w in score_components) / total_weight
+        Args:
+            cards: Kartendaten der Versionen
+            user_art_hash: Hash des User-Artworks
+            preferred: Versionen, die vor allen anderen verglichen werden
         
-        return weighted_score
+        Returns:
+            Tuple aus (verglichene Versionen, Artwork-Score je Version)
+        """
+        if user_art_hash is None:
+            return cards, [None] * len(cards)
+        
+        # Neueste zuerst: Nachdrucke teilen meist das aktuelle Artwork
+        ordered = sorted(cards, key=lambda card: card.get("released_at", ""), reverse=True)
+        if preferred:
+            preferred_ids = {id(card) for card in preferred}
+            ordered.sort(key=lambda card: id(card) not in preferred_ids)
+        
+        scored_cards = []
+        art_scores = []
+        for start in range(0, len(ordered), DOWNLOAD_WORKERS):
+            batch = ordered[start:start + DOWNLOAD_WORKERS]
+            self._prefetch_reference_hashes(batch)
+            batch_scores = self._compare_artwork_batch(batch, user_art_hash)
+            
+            scored_cards.extend(batch)
+            art_scores.extend(batch_scores)
+            
+            if max((score for score in batch_scores if score is not None),
+                   default=0.0) >= EARLY_STOP_ART_SCORE:
+                # Treffer-Artworks (Scryfall illustration_id) -> bester Score
+                matched = {}
+                for card, score in zip(batch, batch_scores):
+                    illustration_id = _illustration_id(card)
+                    if illustration_id and score is not None and score >= EARLY_STOP_ART_SCORE:
+                        matched[illustration_id] = max(score, matched.get(illustration_id, 0.0))
+                
+                # Gleiches Artwork ohne Download übernehmen
+                for card in ordered[start + DOWNLOAD_WORKERS:]:
+                    score = matched.get(_illustration_id(card))
+                    if score is not None:
+                        scored_cards.append(card)
+                        art_scores.append(score)
+                break
+        
+        return scored_cards, art_scores
     
-    def _compare_artwork(self, card_data: Dict, user_art_hash) -> Optional[float]:
+    def _compare_artwork_batch(self, cards: List[Dict],
+                               user_art_hash: Optional[int]) -> List[Optional[float]]:
         """
-        Vergleicht Artwork mittels Perceptual Hash
+        Vergleicht das Artwork mit allen Versionen in einem vektorisierten Schritt
         
         Args:
-            card_data: Kartendaten
+            cards: Kartendaten der Versionen
             user_art_hash: Hash des User-Artworks
         
         Returns:
-            Ähnlichkeitsscore oder None
+            Ähnlichkeitsscore je Version (None ohne Referenz-Hash)
         """
         if user_art_hash is None:
-            return None
+            return [None] * len(cards)
+        
+        ref_hashes = [self._get_reference_hash(card) for card in cards]
+        valid = [ref_hash is not None for ref_hash in ref_hashes]
+        if not any(valid):
+            return [None] * len(cards)
+        
+        hashes = np.array([ref_hash or 0 for ref_hash in ref_hashes], dtype=np.uint64)
         
-        # Bild von Scryfall laden
+        # Differenz zu Score konvertieren (0 Diff = 1.0 Score, 64 = maximale Bit-Differenz)
+        scores = np.maximum(0.0, 1.0 - hamming_distances(hashes, user_art_hash) / 64)
+        
+        return [float(score) if ok else None for score, ok in zip(scores, valid)]
+    
+    def _get_reference_hash(self, card_data: Dict):
+        """
+        Liefert den Artwork-Hash einer Scryfall-Version (Cache oder Download)
+        
+        Args:
+            card_data: Kartendaten
+        
+        Returns:
+            Hash als int oder None
+        """
         image_url = self.api.get_card_image_url(card_data, size="normal")
         if not image_url:
             return None
         
-        # Cache prüfen
-        cache_key = image_url
+        # Cache prüfen - Scryfall-ID ist stabil, Bild-URLs enthalten Zeitstempel
+        cache_key = card_data.get("id") or image_url
         if cache_key in self._image_cache:
-            ref_hash = self._image_cache[cache_key]
+            return self._image_cache[cache_key]
+        
+        stored = self._hash_cache.get(cache_key)
+        if stored is not None:
+            ref_hash = int(stored, 16)
         else:
             # Bild herunterladen
             image_bytes = self.api.download_card_image(card_data, size="normal")
             if not image_bytes:
                 return None
             
-            ref_image = self.processor.load_image_from_bytes(image_bytes)
-            if ref_image is None:
+            # Direkt als Graustufen in halber Auflösung dekodieren (JPEG skaliert
+            # schon beim Dekodieren) - der pHash braucht ohnehin nur 32x32
+            ref_gray = cv2.imdecode(np.frombuffer(image_bytes, np.uint8),
+                                    cv2.IMREAD_REDUCED_GRAYSCALE_2)
+            del image_bytes
+            if ref_gray is None:
                 return None
             
             # Artwork extrahieren
-            ref_art = self.processor.extract_art_region(ref_image)
+            ref_art = self.processor.extract_art_region(ref_gray)
             ref_hash = self._compute_phash(ref_art)
             
-            # Cachen
-            self._image_cache[cache_key] = ref_hash
-        
-        if ref_hash is None:
-            return None
+            # Nur den 64-Bit-Hash dauerhaft speichern, nicht das Bild
+            if ref_hash is not None:
+                self._hash_cache.set(cache_key, format(ref_hash, "016x"), expire=HASH_CACHE_EXPIRE)
         
-        # Hash-Differenz berechnen
-        diff = user_art_hash - ref_hash
+        # Cachen
+        self._image_cache[cache_key] = ref_hash
+        return ref_hash
+    
+    def _prefetch_reference_hashes(self, all_prints: List[Dict]):
+        """
+        Lädt fehlende Referenz-Hashes parallel vor
         
-        # Differenz zu Score konvertieren (0 Diff = 1.0 Score)
-        max_diff = 64  # Maximale Bit-Differenz
-        score = 1.0 - (diff / max_diff)
+        Die Downloads sind netzwerkgebunden; parallel dauert das Laden aller
+        Versionen etwa so lange wie der langsamste Download statt der Summe.
         
-        return max(0.0, score)
+        Args:
+            all_prints: Alle Versionen einer Karte
+        """
+        missing = [card for card in all_prints
+                   if (card.get("id") or self.api.get_card_image_url(card)) not in self._image_cache]
+        if len(missing) < 2:
+            return
+        
+        with ThreadPoolExecutor(max_workers=min(DOWNLOAD_WORKERS, len(missing))) as executor:
+            for future in as_completed([executor.submit(self._get_reference_hash, card)
+                                        for card in missing]):
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Referenzbild konnte nicht geladen werden: {e}")
     
     def _compute_phash(self, image: np.ndarray):
         """
@@ -170,30 +597,22 @@ class CardMatcher:
             image: Eingabebild (OpenCV Format)
         
         Returns:
-            ImageHash oder None
+            Hash als int oder None
         """
         try:
-            # OpenCV zu PIL konvertieren
-            if len(image.shape) == 3:
-                image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            else:
-                image_rgb = image
-            
-            pil_image = Image.fromarray(image_rgb)
-            
-            # Perceptual Hash berechnen
-            return imagehash.phash(pil_image)
+            return compute_phash(image)
         except Exception as e:
             print(f"Hash-Berechnung fehlgeschlagen: {e}")
             return None
     
-    def _compare_colors(self, card_data: Dict, user_image: np.ndarray) -> Optional[float]:
+    def _compare_colors(self, card_data: Dict,
+                        user_features: UserImageFeatures) -> Optional[float]:
         """
         Vergleicht die Farbverteilung
         
         Args:
             card_data: Kartendaten
-            user_image: Benutzerbild
+            user_features: Merkmale des Benutzerbilds
         
         Returns:
             Ähnlichkeitsscore oder None
@@ -202,51 +621,33 @@ class CardMatcher:
         colors = card_data.get("colors", [])
         color_identity = card_data.get("color_identity", colors)
         
-        # Dominante Farbe im Rahmenbereich erkennen
-        height, width = user_image.shape[:2]
+        # Erwartete Rahmenfarbe: ein Lookup statt Fallunterscheidung
+        key = frozenset(color_identity)
+        expected_color = EXPECTED_FRAME_COLORS.get(
+            key, _GOLD_FRAME if len(key) > 1 else _COLORLESS_FRAME
+        )
         
-        # Rahmenbereich (links und rechts)
-        left_border = user_image[:, :int(width*0.05)]
-        right_border = user_image[:, int(width*0.95):]
-        border = np.vstack([left_border, right_border])
-        
-        # Durchschnittsfarbe berechnen
-        avg_color = np.mean(border, axis=(0, 1))
-        
-        # MTG Farben zu RGB (vereinfacht)
-        mtg_colors = {
-            "W": np.array([240, 230, 210]),  # Weiß
-            "U": np.array([50, 100, 180]),   # Blau
-            "B": np.array([50, 50, 60]),     # Schwarz
-            "R": np.array([180, 70, 50]),    # Rot
-            "G": np.array([50, 140, 80]),    # Grün
-        }
-        
-        if not color_identity:
-            # Farblos/Artefakt
-            expected_color = np.array([150, 150, 150])
-        elif len(color_identity) == 1:
-            expected_color = mtg_colors.get(color_identity[0], np.array([150, 150, 150]))
-        else:
-            # Mehrfarbig - Gold
-            expected_color = np.array([200, 170, 80])
+        # Farbdifferenz zur Randfarbe des Benutzerbilds (euklidisch, skalar)
+        user_r, user_g, user_b = user_features.border_rgb_mean
+        exp_r, exp_g, exp_b = expected_color
+        dr, dg, db = user_r - exp_r, user_g - exp_g, user_b - exp_b
+        squared = dr * dr + dg * dg + db * db
         
-        # Farbdifferenz berechnen (BGR zu RGB)
-        user_rgb = avg_color[::-1] if len(avg_color) == 3 else avg_color
-        diff = np.linalg.norm(user_rgb - expected_color)
+        # Zu weit entfernt: Wurzel sparen
+        if squared >= _MAX_COLOR_DIFF * _MAX_COLOR_DIFF:
+            return 0.0
         
         # Normalisieren (max Differenz ~441 für volle RGB-Differenz)
-        score = 1.0 - min(diff / 200, 1.0)
-        
-        return score
+        return 1.0 - math.sqrt(squared) / _MAX_COLOR_DIFF
     
-    def _estimate_frame_match(self, card_data: Dict, user_image: np.ndarray) -> float:
+    def _estimate_frame_match(self, card_data: Dict,
+                              user_features: UserImageFeatures) -> float:
         """
         Schätzt die Rahmenübereinstimmung
         
         Args:
             card_data: Kartendaten
-            user_image: Benutzerbild
+            user_features: Merkmale des Benutzerbilds
         
         Returns:
             Übereinstimmungsscore
@@ -255,23 +656,13 @@ class CardMatcher:
         is_fullart = card_data.get("full_art", False)
         border_color = card_data.get("border_color", "black")
         
-        # Einfache Heuristik basierend auf Bildanalyse
-        height, width = user_image.shape[:2]
-        
-        # Rand analysieren
-        top_border = user_image[:int(height*0.02), :]
-        avg_border = np.mean(top_border)
-        
-        # Schwarzer Rand?
-        has_black_border = avg_border < 50
-        
         # Basis-Score
         score = 0.5
         
-        # Rand-Farbe prüfen
-        if border_color == "black" and has_black_border:
+        # Rand-Farbe prüfen (Heuristik über den oberen Rand des Benutzerbilds)
+        if border_color == "black" and user_features.has_black_border:
             score += 0.25
-        elif border_color == "white" and avg_border > 200:
+        elif border_color == "white" and user_features.top_border_mean > 200:
             score += 0.25
         elif border_color == "borderless":
             score += 0.1
@@ -294,21 +685,34 @@ class CardMatcher:
         Returns:
             Kartendaten oder None
         """
-        all_prints = self.api.get_all_prints(card_name)
+        table = self._get_print_table(card_name)
         
-        for card in all_prints:
-            if card.get("collector_number") == collector_number:
-                return card
+        card = table.by_number.get(collector_number)
+        if card is not None:
+            return card
         
         # Fuzzy Match für Sammlernummer
-        collector_num_clean = collector_number.split("/")[0].lstrip("0")
+        return table.by_number_clean.get(_normalize_collector_number(collector_number))
+    
+    def _get_print_table(self, card_name: str) -> _PrintTable:
+        """
+        Liefert die Spaltentabelle aller Versionen (einmal pro Name aufgebaut)
         
-        for card in all_prints:
-            card_num = card.get("collector_number", "").split("/")[0].lstrip("0")
-            if card_num == collector_num_clean:
-                return card
+        Args:
+            card_name: Kartenname
         
-        return None
+        Returns:
+            _PrintTable (leer wenn die Karte nicht gefunden wurde)
+        """
+        cache_key = " ".join(card_name.split()).lower()
+        table = self._print_tables.get(cache_key)
+        if table is not None:
+            return table
+        
+        table = _PrintTable(self.api.get_all_prints(card_name))
+        if table.prints:
+            self._print_tables[cache_key] = table
+        return table
     
     def match_by_set_symbol(self, card_name: str, 
                            set_symbol_image: np.ndarray) -> List[Dict]:
@@ -323,13 +727,12 @@ class CardMatcher:
             Mögliche Versionen
         """
         # Set-Symbol-Erkennung ist komplex - vereinfachte Implementation
-        all_prints = self.api.get_all_prints(card_name)
+        table = self._get_print_table(card_name)
         
         # Analysiere Symbol-Farbe für Seltenheit
+        # cv2.mean liefert alle Kanal-Mittelwerte in einem Durchlauf
         hsv = cv2.cvtColor(set_symbol_image, cv2.COLOR_BGR2HSV)
-        avg_hue = np.mean(hsv[:, :, 0])
-        avg_saturation = np.mean(hsv[:, :, 1])
-        avg_value = np.mean(hsv[:, :, 2])
+        avg_hue, avg_saturation, avg_value = cv2.mean(hsv)[:3]
         
         # Seltenheit basierend auf Farbe schätzen
         estimated_rarity = "common"
@@ -343,9 +746,9 @@ class CardMatcher:
                 estimated_rarity = "uncommon"
         
         # Filter nach Seltenheit
-        filtered = [c for c in all_prints if c.get("rarity") == estimated_rarity]
+        filtered = table.select(table.rarities == estimated_rarity)
         
-        return filtered if filtered else all_prints
+        return filtered if filtered else table.prints
     
     def batch_identify(self, cards: List[Tuple[str, np.ndarray]], 
                        workers: int = 4) -> List[Dict]:
@@ -357,37 +760,41 @@ class CardMatcher:
             workers: Anzahl paralleler Worker
         
         Returns:
-            Liste von Ergebnissen
+            Liste von Ergebnissen (in Reihenfolge der Eingabe)
         """
-        results = []
-        
         with ThreadPoolExecutor(max_workers=workers) as executor:
-            futures = {
-                executor.submit(self.find_best_match, name, image, 1): (name, image)
-                for name, image in cards
-            }
-            
-            for future in as_completed(futures):
-                name, _ = futures[future]
-                try:
-                    matches = future.result()
-                    if matches:
-                        results.append(matches[0])
-                    else:
-                        results.append({
-                            "name": name,
-                            "score": 0.0,
-                            "error": "Keine Übereinstimmung gefunden"
-                        })
-                except Exception as e:
-                    results.append({
-                        "name": name,
-                        "score": 0.0,
-                        "error": str(e)
-                    })
+            # map liefert die Ergebnisse in Eingabereihenfolge
+            return list(executor.map(self._identify_one, cards))
+    
+    def _identify_one(self, card: Tuple[str, np.ndarray]) -> Dict:
+        """
+        Bestes Ergebnis für eine Karte aus batch_identify
         
-        return results
+        Fehler werden als Ergebnis zurückgegeben, damit eine fehlerhafte
+        Karte nicht den ganzen Stapel abbricht.
+        """
+        name, image = card
+        try:
+            matches = self.find_best_match(name, image, 1)
+        except Exception as e:
+            return {"name": name, "score": 0.0, "error": str(e)}
+        
+        if matches:
+            return matches[0]
+        return {
+            "name": name,
+            "score": 0.0,
+            "error": "Keine Übereinstimmung gefunden"
+        }
     
-    def clear_cache(self):
-        """Leert den Bildcache"""
+    def clear_cache(self, persistent: bool = False):
+        """
+        Leert den Bildcache
+        
+        Args:
+            persistent: Auch die gespeicherten Hashes auf der Festplatte löschen
+        """
         self._image_cache.clear()
+        self._print_tables.clear()
+        if persistent:
+            self._hash_cache.clear()
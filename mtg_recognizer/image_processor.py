@@ -4,9 +4,98 @@ Bildverarbeitungsmodul für MTG Kartenerkennung
 
 import cv2
 import numpy as np
-from PIL import Image
 from typing import Tuple, Optional, List
 import io
+import threading
+
+
+# cv2.dct ist orthonormal; Zeile/Spalte 0 so skalieren, dass die Verhältnisse
+# der unnormierten DCT-II entsprechen (gleiche Bits wie imagehash.phash)
+_PHASH_DCT_SCALE = np.ones((8, 8), dtype=np.float32)
+_PHASH_DCT_SCALE[0, :] *= np.sqrt(2)
+_PHASH_DCT_SCALE[:, 0] *= np.sqrt(2)
+
+# Verkleinerungsfaktor -> imdecode-Flag (JPEG skaliert schon beim Dekodieren)
+_IMREAD_REDUCED_COLOR = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Unscharfmaskierung für enhance_for_matching: img + AMOUNT * (img - blur)
+_UNSHARP_SIGMA = 1.0
+_UNSHARP_AMOUNT = 0.5
+
+
+def compute_phash(image: np.ndarray) -> Optional[int]:
+    """
+    Berechnet einen 64-Bit Perceptual Hash (DCT) direkt mit OpenCV
+    
+    Graustufen, 32x32 verkleinern, DCT, 8x8 niedrige Frequenzen gegen den
+    Median vergleichen. Die Bits sind wie bei imagehash.phash angeordnet,
+    hex(hash) ist also kompatibel - nur ohne PIL-Umweg und Zwischenobjekte.
+    
+    Args:
+        image: Eingabebild (BGR oder Graustufen)
+    
+    Returns:
+        Hash als int oder None
+    """
+    if image is None or image.size == 0:
+        return None
+    
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low_freq = cv2.dct(small)[:8, :8] * _PHASH_DCT_SCALE
+    bits = low_freq > np.median(low_freq)
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+if hasattr(np, "bitwise_count"):
+    def _popcount_u64(values: np.ndarray) -> np.ndarray:
+        """Gesetzte Bits je Element (NumPy 2.0+: vektorisiertes POPCNT)"""
+        return np.bitwise_count(values)
+else:
+    def _popcount_u64(values: np.ndarray) -> np.ndarray:
+        """Gesetzte Bits je Element"""
+        return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+def hamming_distances(hashes: np.ndarray, hash_value: int) -> np.ndarray:
+    """
+    Hamming-Distanz eines Hashes zu vielen Hashes in einem Schritt
+    
+    Args:
+        hashes: uint64-Array der Vergleichshashes
+        hash_value: Einzelner 64-Bit-Hash
+    
+    Returns:
+        Array mit der Anzahl unterschiedlicher Bits je Eintrag
+    """
+    return _popcount_u64(np.bitwise_xor(hashes, np.uint64(hash_value)))
+
+
+class ThreadLocalCLAHE:
+    """
+    CLAHE mit einem eigenen cv2-Objekt pro Thread
+    
+    cv2.CLAHE hält interne Puffer und darf nicht gleichzeitig aus mehreren
+    Threads benutzt werden; so bleibt es trotzdem pro Thread wiederverwendbar.
+    """
+    
+    def __init__(self, clip_limit: float, tile_grid_size: Tuple[int, int] = (8, 8)):
+        self.clip_limit = clip_limit
+        self.tile_grid_size = tile_grid_size
+        self._local = threading.local()
+    
+    def apply(self, image):
+        """Wendet CLAHE mit dem Objekt des aktuellen Threads an"""
+        clahe = getattr(self._local, "clahe", None)
+        if clahe is None:
+            clahe = cv2.createCLAHE(clipLimit=self.clip_limit, tileGridSize=self.tile_grid_size)
+            self._local.clahe = clahe
+        return clahe.apply(image)
 
 
 class ImageProcessor:
@@ -16,26 +105,56 @@ class ImageProcessor:
     CARD_ASPECT_RATIO = 63 / 88  # ~0.716
     CARD_ASPECT_TOLERANCE = 0.15
     
-    def __init__(self):
+    def __init__(self, use_opencl: bool = False):
+        """
+        Initialisiert den ImageProcessor
+        
+        Args:
+            use_opencl: Vorverarbeitung und Kartenerkennung über OpenCLs
+                        Transparent API (cv2.UMat) auf der GPU ausführen,
+                        sofern ein OpenCL-Gerät verfügbar ist
+        """
+        self.use_opencl = bool(use_opencl) and cv2.ocl.haveOpenCL()
+        if self.use_opencl:
+            cv2.ocl.setUseOpenCL(True)
+        
         self.target_width = 480
         self.target_height = int(self.target_width / self.CARD_ASPECT_RATIO)
+        # CLAHE-Objekte einmal (pro Thread) anlegen statt bei jedem Aufruf
+        self._clahe_ocr = ThreadLocalCLAHE(clip_limit=2.0)
+        self._clahe_matching = ThreadLocalCLAHE(clip_limit=3.0)
+        # Ausschnittsgrenzen der vergrößerten OCR-Regionen je Bildgröße
+        self._region_bounds = {}
     
-    def load_image(self, image_path: str) -> Optional[np.ndarray]:
+    def load_image(self, image_path: str, reduce: int = 1) -> Optional[np.ndarray]:
         """
         Lädt ein Bild von Datei
         
         Args:
             image_path: Pfad zur Bilddatei
+            reduce: Verkleinerung beim Dekodieren (1, 2, 4 oder 8), z.B. wenn
+                    das Bild nur gehasht oder verglichen wird
         
         Returns:
             OpenCV Bild (BGR) oder None
         """
         try:
-            image = cv2.imread(image_path)
+            # Datei selbst lesen und im Speicher dekodieren: funktioniert auch
+            # mit Nicht-ASCII-Pfaden unter Windows
+            image = cv2.imdecode(np.fromfile(image_path, dtype=np.uint8),
+                                 _IMREAD_REDUCED_COLOR.get(reduce, cv2.IMREAD_COLOR))
             if image is None:
-                # Versuche mit PIL zu laden (für mehr Formate)
+                # Versuche mit PIL zu laden (für mehr Formate); erst hier
+                # importiert, da der Fallback selten gebraucht wird
+                from PIL import Image
                 pil_image = Image.open(image_path)
-                image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
+                if reduce > 1:
+                    # JPEG: libjpeg verkleinert schon beim Dekodieren
+                    pil_image.draft("RGB", (pil_image.width // reduce, pil_image.height // reduce))
+                if pil_image.mode != "RGB":
+                    pil_image = pil_image.convert("RGB")
+                # asarray ist ohne Kopie, cvtColor erzeugt das einzige neue Array
+                image = cv2.cvtColor(np.asarray(pil_image), cv2.COLOR_RGB2BGR)
             return image
         except Exception as e:
             print(f"Fehler beim Laden des Bildes: {e}")
@@ -59,25 +178,30 @@ class ImageProcessor:
             print(f"Fehler beim Laden des Bildes aus Bytes: {e}")
             return None
     
-    def preprocess_for_ocr(self, image: np.ndarray) -> np.ndarray:
+    def preprocess_for_ocr(self, image: np.ndarray,
+                           gray: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Bereitet Bild für OCR vor
         
         Args:
             image: Eingabebild (BGR)
+            gray: Bereits vorhandenes Graustufenbild (spart die Umrechnung)
         
         Returns:
             Vorverarbeitetes Bild für OCR
         """
         # In Graustufen konvertieren
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if gray is None:
+            gray = cv2.cvtColor(self._to_device(image), cv2.COLOR_BGR2GRAY)
+        else:
+            gray = self._to_device(gray)
         
-        # Rauschen reduzieren
-        denoised = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
+        # Rauschen reduzieren (3x3-Median genügt für Text-Ausschnitte,
+        # NL-Means wäre um Größenordnungen teurer)
+        denoised = cv2.medianBlur(gray, 3)
         
         # Kontrast erhöhen mit CLAHE
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        enhanced = clahe.apply(denoised)
+        enhanced = self._clahe_ocr.apply(denoised)
         
         # Binarisierung mit adaptivem Threshold
         binary = cv2.adaptiveThreshold(
@@ -85,7 +209,16 @@ class ImageProcessor:
             cv2.THRESH_BINARY, 11, 2
         )
         
-        return binary
+        return self._to_host(binary)
+    
+    def _to_device(self, image: np.ndarray):
+        """Lädt ein Bild für die OpenCL-Verarbeitung hoch (ohne OpenCL unverändert)"""
+        return cv2.UMat(image) if self.use_opencl and isinstance(image, np.ndarray) else image
+    
+    @staticmethod
+    def _to_host(image) -> np.ndarray:
+        """Holt ein Ergebnis von der GPU zurück (NumPy-Arrays unverändert)"""
+        return image.get() if isinstance(image, cv2.UMat) else image
     
     def extract_card_region(self, image: np.ndarray) -> Tuple[Optional[np.ndarray], float]:
         """
@@ -97,24 +230,55 @@ class ImageProcessor:
         Returns:
             Tuple aus (extrahierte Kartenregion, Konfidenz)
         """
+        card, _, confidence = self.extract_card_and_gray(image)
+        return card, confidence
+    
+    def extract_card_and_gray(self, image: np.ndarray) -> Tuple[Optional[np.ndarray],
+                                                                Optional[np.ndarray], float]:
+        """
+        Wie extract_card_region, liefert zusätzlich die Karte in Graustufen
+        
+        Das Graustufenbild der Kantenerkennung wird mit entzerrt, die OCR
+        muss die Karte also nicht noch einmal umrechnen.
+        
+        Args:
+            image: Eingabebild mit Karte
+        
+        Returns:
+            Tuple aus (Kartenregion BGR, Kartenregion Graustufen, Konfidenz)
+        """
         # In Graustufen konvertieren
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        gray = cv2.cvtColor(self._to_device(image), cv2.COLOR_BGR2GRAY)
         
-        # Kanten erkennen
-        edges = cv2.Canny(gray, 50, 150)
+        # Kanten erkennen (Konturensuche läuft auf der CPU)
+        edges = self._to_host(cv2.Canny(gray, 50, 150))
         
         # Konturen finden
         contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
         if not contours:
-            return None, 0.0
+            return None, None, 0.0
         
         # Nach größter Kontur mit passendem Seitenverhältnis suchen
-        best_card = None
+        best_corners = None
         best_confidence = 0.0
         image_area = image.shape[0] * image.shape[1]
         
-        for contour in contours:
+        # Das Rechteck der Näherung liegt innerhalb des Kontur-Rechtecks:
+        # dessen Fläche ist eine obere Schranke für die erreichbare Konfidenz
+        # Vorfilter und Sortierung als Spaltenoperation über alle Konturen
+        rects = np.array([cv2.boundingRect(contour) for contour in contours], dtype=np.int64)
+        bound_areas = rects[:, 2] * rects[:, 3]
+        order = np.argsort(-bound_areas, kind="stable")
+        order = order[bound_areas[order] > 0.1 * image_area]
+        bound_confidences = np.minimum(bound_areas[order] / image_area * 2, 1.0)
+        
+        for index, bound_confidence in zip(order.tolist(), bound_confidences.tolist()):
+            # Kleinere Konturen können die beste Konfidenz nicht mehr übertreffen
+            if bound_confidence <= best_confidence:
+                break
+            
+            contour = contours[index]
             # Approximiere die Kontur
             epsilon = 0.02 * cv2.arcLength(contour, True)
             approx = cv2.approxPolyDP(contour, epsilon, True)
@@ -134,13 +298,16 @@ class ImageProcessor:
                         confidence = min(area_ratio * 2, 1.0)
                         if confidence > best_confidence:
                             best_confidence = confidence
-                            best_card = self._warp_perspective(image, approx)
+                            best_corners = approx
         
         # Fallback: Gesamtes Bild verwenden
-        if best_card is None:
-            return self.resize_to_standard(image), 0.5
+        if best_corners is None:
+            return (self.resize_to_standard(image),
+                    self._to_host(self.resize_to_standard(gray)), 0.5)
         
-        return best_card, best_confidence
+        # Nur die endgültige Karte entzerren
+        return (self._warp_perspective(image, best_corners),
+                self._warp_perspective(gray, best_corners), best_confidence)
     
     def _warp_perspective(self, image: np.ndarray, corners: np.ndarray) -> np.ndarray:
         """
@@ -153,17 +320,17 @@ class ImageProcessor:
         Returns:
             Entzerrtes Kartenbild
         """
-        # Sortiere Ecken: oben-links, oben-rechts, unten-rechts, unten-links
-        corners = corners.reshape(4, 2)
-        rect = np.zeros((4, 2), dtype="float32")
-        
-        s = corners.sum(axis=1)
-        rect[0] = corners[np.argmin(s)]  # oben-links
-        rect[2] = corners[np.argmax(s)]  # unten-rechts
-        
-        diff = np.diff(corners, axis=1)
-        rect[1] = corners[np.argmin(diff)]  # oben-rechts
-        rect[3] = corners[np.argmax(diff)]  # unten-links
+        # Sortiere Ecken: oben-links, oben-rechts, unten-rechts, unten-links.
+        # Nach Winkel um den Mittelpunkt sortiert (im Bild mit y nach unten
+        # im Uhrzeigersinn) - anders als Summe/Differenz der Koordinaten auch
+        # bei um ~45° gedrehten Karten eindeutig
+        corners = corners.reshape(4, 2).astype("float32")
+        center = corners.mean(axis=0)
+        angles = np.arctan2(corners[:, 1] - center[1], corners[:, 0] - center[0])
+        rect = corners[np.argsort(angles)]
+        
+        # Ecke mit kleinster Koordinatensumme (oben-links) an den Anfang
+        rect = np.roll(rect, -int(np.argmin(rect.sum(axis=1))), axis=0)
         
         # Zielgröße
         dst = np.array([
@@ -175,9 +342,10 @@ class ImageProcessor:
         
         # Perspektivtransformation
         M = cv2.getPerspectiveTransform(rect, dst)
-        warped = cv2.warpPerspective(image, M, (self.target_width, self.target_height))
+        warped = cv2.warpPerspective(self._to_device(image), M,
+                                     (self.target_width, self.target_height))
         
-        return warped
+        return self._to_host(warped)
     
     def resize_to_standard(self, image: np.ndarray) -> np.ndarray:
         """
@@ -201,22 +369,9 @@ class ImageProcessor:
         Returns:
             Titelregion für OCR
         """
-        height, width = card_image.shape[:2]
-        
-        # Titelbereich: obere ~8% der Karte, mit Rand
-        title_top = int(height * 0.045)
-        title_bottom = int(height * 0.095)
-        title_left = int(width * 0.05)
-        title_right = int(width * 0.75)  # Manakosten ausschließen
-        
-        title_region = card_image[title_top:title_bottom, title_left:title_right]
-        
-        # Vergrößern für bessere OCR
-        scale = 3
-        title_region = cv2.resize(title_region, None, fx=scale, fy=scale, 
-                                  interpolation=cv2.INTER_CUBIC)
-        
-        return title_region
+        # Titelbereich: obere ~8% der Karte, mit Rand (Manakosten ausschließen),
+        # für bessere OCR 3x vergrößert
+        return self._upscaled_region(card_image, "title", 0.045, 0.095, 0.05, 0.75)
     
     def extract_set_symbol_region(self, card_image: np.ndarray) -> np.ndarray:
         """
@@ -250,22 +405,38 @@ class ImageProcessor:
         Returns:
             Region mit Sammlernummer für OCR
         """
-        height, width = card_image.shape[:2]
-        
-        # Sammlernummer: unten links
-        number_top = int(height * 0.945)
-        number_bottom = int(height * 0.985)
-        number_left = int(width * 0.05)
-        number_right = int(width * 0.35)
+        # Sammlernummer: unten links, für bessere OCR 3x vergrößert
+        return self._upscaled_region(card_image, "number", 0.945, 0.985, 0.05, 0.35)
+    
+    def _upscaled_region(self, card_image: np.ndarray, region: str,
+                         top: float, bottom: float, left: float, right: float,
+                         scale: int = 3) -> np.ndarray:
+        """
+        Schneidet eine Region aus und vergrößert sie für die OCR
         
-        number_region = card_image[number_top:number_bottom, number_left:number_right]
+        Die Grenzen hängen nur von der Bildgröße ab und werden pro Größe
+        einmal berechnet. Ausschnitt + cv2.resize bleibt bewusst: ein
+        vorberechnetes cv2.remap war gemessen um ein Vielfaches langsamer.
         
-        # Vergrößern für bessere OCR
-        scale = 3
-        number_region = cv2.resize(number_region, None, fx=scale, fy=scale,
-                                   interpolation=cv2.INTER_CUBIC)
+        Args:
+            card_image: Normalisiertes Kartenbild
+            region: Name der Region (Cache-Schlüssel)
+            top, bottom, left, right: Grenzen relativ zur Bildgröße
+            scale: Vergrößerungsfaktor
         
-        return number_region
+        Returns:
+            Vergrößerte Region
+        """
+        height, width = card_image.shape[:2]
+        key = (region, height, width)
+        bounds = self._region_bounds.get(key)
+        if bounds is None:
+            bounds = (slice(int(height * top), int(height * bottom)),
+                      slice(int(width * left), int(width * right)))
+            self._region_bounds[key] = bounds
+        
+        return cv2.resize(card_image[bounds], None, fx=scale, fy=scale,
+                          interpolation=cv2.INTER_CUBIC)
     
     def extract_art_region(self, card_image: np.ndarray) -> np.ndarray:
         """
@@ -291,26 +462,19 @@ class ImageProcessor:
     
     def compute_image_hash(self, image: np.ndarray) -> str:
         """
-        Berechnet einen perzeptuellen Hash für Bildvergleich
+        Berechnet einen perzeptuellen Hash (DCT-pHash) für Bildvergleich
         
         Args:
             image: Eingabebild
         
         Returns:
-            Hash als Hex-String
+            Hash als Hex-String (16 Zeichen, leer bei leerem Bild)
         """
-        # Auf 8x8 verkleinern
-        small = cv2.resize(image, (8, 8))
-        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if len(small.shape) == 3 else small
+        hash_value = compute_phash(image)
+        if hash_value is None:
+            return ""
         
-        # Durchschnitt berechnen
-        avg = gray.mean()
-        
-        # Hash erstellen
-        hash_bits = (gray > avg).flatten()
-        hash_int = sum([2**i for i, v in enumerate(hash_bits) if v])
-        
-        return format(hash_int, '016x')
+        return format(hash_value, '016x')
     
     def compare_images(self, image1: np.ndarray, image2: np.ndarray) -> float:
         """
@@ -323,53 +487,49 @@ class ImageProcessor:
         Returns:
             Ähnlichkeit (0.0 - 1.0)
         """
-        # Auf gleiche Größe bringen
+        # Erst in Graustufen, dann verkleinern: nur ein Kanal durchläuft das
+        # Resize, INTER_AREA mittelt beim Verkleinern jeden Quellpixel genau einmal
         size = (256, 256)
-        img1_resized = cv2.resize(image1, size)
-        img2_resized = cv2.resize(image2, size)
-        
-        # In Graustufen konvertieren
-        if len(img1_resized.shape) == 3:
-            img1_gray = cv2.cvtColor(img1_resized, cv2.COLOR_BGR2GRAY)
-        else:
-            img1_gray = img1_resized
-            
-        if len(img2_resized.shape) == 3:
-            img2_gray = cv2.cvtColor(img2_resized, cv2.COLOR_BGR2GRAY)
-        else:
-            img2_gray = img2_resized
+        img1_gray = cv2.cvtColor(image1, cv2.COLOR_BGR2GRAY) if image1.ndim == 3 else image1
+        img2_gray = cv2.cvtColor(image2, cv2.COLOR_BGR2GRAY) if image2.ndim == 3 else image2
+        img1_gray = cv2.resize(img1_gray, size, interpolation=cv2.INTER_AREA)
+        img2_gray = cv2.resize(img2_gray, size, interpolation=cv2.INTER_AREA)
         
-        # Strukturelle Ähnlichkeit (vereinfacht)
-        diff = cv2.absdiff(img1_gray, img2_gray)
-        similarity = 1.0 - (np.mean(diff) / 255.0)
+        # Strukturelle Ähnlichkeit (vereinfacht): mittlere absolute Differenz,
+        # cv2.norm summiert direkt ohne temporäres Differenzbild
+        diff_sum = cv2.norm(img1_gray, img2_gray, cv2.NORM_L1)
+        similarity = 1.0 - diff_sum / (255.0 * size[0] * size[1])
         
         return similarity
     
-    def enhance_for_matching(self, image: np.ndarray) -> np.ndarray:
+    def enhance_for_matching(self, image: np.ndarray, grayscale: bool = False) -> np.ndarray:
         """
         Verbessert Bild für Kartenabgleich
         
         Args:
             image: Eingabebild
+            grayscale: Nur ein Graustufenbild liefern (z.B. für compare_images),
+                       spart die Farbraum-Umrechnung
         
         Returns:
-            Verbessertes Bild
+            Verbessertes Bild (BGR bzw. Graustufen)
         """
-        # Farbkorrektur
-        lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
-        l, a, b = cv2.split(lab)
-        
-        # CLAHE auf L-Kanal
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-        l = clahe.apply(l)
-        
-        enhanced = cv2.merge([l, a, b])
-        enhanced = cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
+        if grayscale:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+            enhanced = self._clahe_matching.apply(gray)
+        else:
+            # Farbkorrektur über YCrCb: lineare Umrechnung, günstiger als LAB
+            ycrcb = cv2.cvtColor(image, cv2.COLOR_BGR2YCrCb)
+            y, cr, cb = cv2.split(ycrcb)
+            
+            # CLAHE auf Helligkeitskanal
+            y = self._clahe_matching.apply(y)
+            
+            enhanced = cv2.merge([y, cr, cb])
+            enhanced = cv2.cvtColor(enhanced, cv2.COLOR_YCrCb2BGR)
         
-        # Leichte Schärfung
-        kernel = np.array([[-1, -1, -1],
-                          [-1,  9, -1],
-                          [-1, -1, -1]])
-        enhanced = cv2.filter2D(enhanced, -1, kernel)
+        # Leichte Schärfung (Unscharfmaske: separierbarer Gauß + ein addWeighted)
+        blurred = cv2.GaussianBlur(enhanced, (0, 0), _UNSHARP_SIGMA)
+        enhanced = cv2.addWeighted(enhanced, 1.0 + _UNSHARP_AMOUNT, blurred, -_UNSHARP_AMOUNT, 0)
         
         return enhanced
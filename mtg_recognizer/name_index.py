@@ -0,0 +1,232 @@
+"""
+Lokaler Namensindex für MTG Karten (Autovervollständigung und OCR-Korrektur)
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .cache import DiskCache
+
+# Markiert im Trie das Ende eines Namens (leerer String kommt als Zeichen nicht vor)
+_END = ""
+
+# Der Katalog ändert sich nur mit neuen Sets
+CARD_NAMES_EXPIRE = 24 * 3600
+
+
+class CardNameIndex:
+    """
+    Radix-Trie über alle Kartennamen
+    
+    Kanten tragen ganze Zeichenketten statt einzelner Zeichen, das hält den
+    Speicherbedarf bei ~30.000 Namen klein. Suchen sind unabhängig von
+    Groß-/Kleinschreibung und laufen komplett lokal.
+    """
+    
+    def __init__(self, names: Iterable[str]):
+        """
+        Baut den Index auf
+        
+        Args:
+            names: Kartennamen in beliebiger Reihenfolge
+        """
+        self._names = {name.lower(): name for name in names}
+        self._entries = sorted(self._names.items())
+        self._root = self._build(0, len(self._entries), 0)
+        # Nur für den Aufbau benötigt
+        del self._entries
+    
+    @classmethod
+    def from_api(cls, api, cache: Optional[DiskCache] = None) -> Optional["CardNameIndex"]:
+        """
+        Erstellt den Index aus dem Scryfall-Katalog (auf der Festplatte gecacht)
+        
+        Args:
+            api: ScryfallAPI Instanz
+            cache: Optionaler Cache für die Namensliste
+        
+        Returns:
+            CardNameIndex oder None wenn der Katalog nicht verfügbar ist
+        """
+        cache = cache if cache is not None else DiskCache("catalog")
+        names = cache.get("card-names")
+        if not names:
+            names = api.get_card_names()
+            if not names:
+                return None
+            cache.set("card-names", names, expire=CARD_NAMES_EXPIRE)
+        return cls(names)
+    
+    def _build(self, lo: int, hi: int, depth: int) -> Dict:
+        """
+        Baut rekursiv einen Knoten aus sortierten Einträgen mit gemeinsamem Präfix
+        
+        Args:
+            lo, hi: Bereich in self._entries
+            depth: Länge des gemeinsamen Präfix
+        
+        Returns:
+            Knoten: {erstes Zeichen: (Kantenbeschriftung, Kindknoten)}
+        """
+        entries = self._entries
+        node = {}
+        i = lo
+        
+        while i < hi:
+            lower, name = entries[i]
+            if len(lower) == depth:
+                node[_END] = name
+                i += 1
+                continue
+            
+            # Alle Einträge mit demselben nächsten Zeichen gruppieren
+            char = lower[depth]
+            j = i + 1
+            while j < hi and entries[j][0][depth] == char:
+                j += 1
+            
+            # Gemeinsames Präfix der Gruppe = Präfix von erstem und letztem (sortiert)
+            first, last = lower, entries[j - 1][0]
+            end = depth + 1
+            while end < len(first) and end < len(last) and first[end] == last[end]:
+                end += 1
+            
+            node[char] = (first[depth:end], self._build(i, j, end))
+            i = j
+        
+        return node
+    
+    def __len__(self) -> int:
+        return len(self._names)
+    
+    def __contains__(self, name: str) -> bool:
+        return self.lookup(name) is not None
+    
+    def lookup(self, name: str) -> Optional[str]:
+        """
+        Exakter Treffer ohne Beachtung der Groß-/Kleinschreibung
+        
+        Args:
+            name: Gesuchter Name
+        
+        Returns:
+            Kanonischer Kartenname oder None
+        """
+        return self._names.get(" ".join(name.split()).lower())
+    
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """
+        Autovervollständigung: alle Namen mit diesem Präfix (alphabetisch)
+        
+        Args:
+            prefix: Anfang des Namens
+            limit: Maximale Anzahl
+        
+        Returns:
+            Liste passender Kartennamen
+        """
+        prefix = " ".join(prefix.split()).lower()
+        node = self._root
+        pos = 0
+        
+        while pos < len(prefix):
+            edge = node.get(prefix[pos])
+            if edge is None:
+                return []
+            label, child = edge
+            rest = prefix[pos:pos + len(label)]
+            if not label.startswith(rest):
+                return []
+            pos += len(label)
+            node = child
+        
+        results = []
+        self._collect(node, results, limit)
+        return results
+    
+    def _collect(self, node: Dict, results: List[str], limit: int):
+        """Sammelt Namen unterhalb eines Knotens in sortierter Reihenfolge"""
+        for key, value in node.items():
+            if len(results) >= limit:
+                return
+            if key == _END:
+                results.append(value)
+            else:
+                self._collect(value[1], results, limit)
+    
+    def correct(self, text: str, max_distance: int = 1, limit: int = 5) -> List[str]:
+        """
+        Findet Namen mit höchstens max_distance Tippfehlern (Levenshtein)
+        
+        Die Editierdistanz wird zeilenweise entlang der Trie-Kanten berechnet;
+        Teilbäume, deren Zeilenminimum die Schranke überschreitet, entfallen.
+        
+        Args:
+            text: OCR-Text oder Eingabe
+            max_distance: Maximale Editierdistanz
+            limit: Maximale Anzahl
+        
+        Returns:
+            Kartennamen, nach Distanz und alphabetisch sortiert
+        """
+        return [name for _, name in self.correct_with_distance(text, max_distance, limit)]
+    
+    def correct_with_distance(self, text: str, max_distance: int = 1,
+                              limit: int = 5) -> List[Tuple[int, str]]:
+        """
+        Wie correct, liefert aber zusätzlich die Distanz jedes Treffers
+        
+        Damit lässt sich erkennen, ob mehrere Namen gleich weit entfernt sind.
+        
+        Returns:
+            (Distanz, Kartenname)-Paare, nach Distanz und alphabetisch sortiert
+        """
+        word = " ".join(text.split()).lower()
+        if not word:
+            return []
+        
+        matches: List[Tuple[int, str]] = []
+        self._search(self._root, word, list(range(len(word) + 1)), 0, max_distance, matches)
+        matches.sort()
+        return matches[:limit]
+    
+    def _search(self, node: Dict, word: str, row: List[int], depth: int, max_distance: int,
+                matches: List[Tuple[int, str]]):
+        """
+        Levenshtein-Suche ab einem Knoten
+        
+        row ist die DP-Zeile für den Pfad bis hier (depth Zeichen). Pro Zeile
+        werden nur die Zellen im Band |i - depth| <= max_distance berechnet,
+        alle übrigen liegen ohnehin über der Schranke (Ukkonen).
+        """
+        size = len(word)
+        limit = max_distance + 1
+        
+        for key, value in node.items():
+            if key == _END:
+                if row[-1] <= max_distance:
+                    matches.append((row[-1], value))
+                continue
+            
+            label, child = value
+            current = row
+            level = depth
+            for char in label:
+                level += 1
+                previous = current
+                current = [limit] * (size + 1)
+                if level <= max_distance:
+                    current[0] = level
+                best = current[0]
+                for i in range(max(1, level - max_distance), min(size, level + max_distance) + 1):
+                    cost = min(
+                        current[i - 1] + 1,
+                        previous[i] + 1,
+                        previous[i - 1] + (word[i - 1] != char)
+                    )
+                    current[i] = cost
+                    if cost < best:
+                        best = cost
+                if best > max_distance:
+                    break
+            else:
+                self._search(child, word, current, level, max_distance, matches)
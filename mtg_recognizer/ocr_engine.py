@@ -5,36 +5,147 @@ OCR Engine für MTG Kartentexterkennung
 import cv2
 import numpy as np
 import re
-from typing import Optional, Tuple
+from typing import List, Optional, Tuple
+import threading
 try:
     import pytesseract
 except ImportError:
     pytesseract = None
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+from .image_processor import ImageProcessor, ThreadLocalCLAHE
+
+
+# Vorkompilierte Muster (werden pro OCR-Aufruf wiederverwendet)
+_CLEAN_RE = re.compile(r'[^a-zA-Z0-9\s,\'\"-]')
+# Tabelle für str.translate mit denselben Regeln wie _CLEAN_RE (nur ASCII),
+# zusätzlich wird die häufige Verwechslung Pipe -> l korrigiert
+_CLEAN_ASCII_TABLE = {c: None for c in range(128) if _CLEAN_RE.match(chr(c))}
+_CLEAN_ASCII_TABLE[ord('|')] = 'l'
+_COLLECTOR_RE = re.compile(r'(\d+)(?:/(\d+))?')
+# Set-Code: 3-4 Zeichen als ganzes Wort, mindestens ein Buchstabe (z.B. "M21", "2XM")
+_SET_CODE_RE = re.compile(r'\b(?=[0-9]*[A-Z])[A-Z0-9]{3,4}\b')
+# Weißer Abstand zwischen den Ausschnitten im gemeinsamen OCR-Bild
+_FUSED_GAP = 20
+# Weißer Rand um jeden vorverarbeiteten Ausschnitt
+_OCR_BORDER = 10
+
+# Zeichen der Tesseract-Whitelists
+_TITLE_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 ,'\"-"
+_NUMBER_CHARS = "0123456789/"
+# Einstellungen für tesserocr je Modus: (Page Segmentation Mode, Whitelist)
+_TESSEROCR_MODES = {
+    "title": (7, _TITLE_CHARS),       # eine Textzeile
+    "number": (7, _NUMBER_CHARS),
+    "general": (6, None),             # ein Textblock
+    "fused": (6, _TITLE_CHARS + "/"),
+}
 
 
 class OCREngine:
     """OCR-basierte Texterkennung für MTG Karten"""
     
-    def __init__(self, tesseract_path: Optional[str] = None):
+    def __init__(self, tesseract_path: Optional[str] = None,
+                 processor: Optional[ImageProcessor] = None):
         """
         Initialisiert die OCR Engine
         
+        Mit installiertem tesserocr wird Tesseract direkt als Bibliothek
+        genutzt (ein geladenes Modell pro Thread statt eines neuen Prozesses
+        pro Aufruf), sonst pytesseract.
+        
         Args:
-            tesseract_path: Optionaler Pfad zur Tesseract-Executable
+            tesseract_path: Optionaler Pfad zur Tesseract-Executable (pytesseract)
+            processor: Optionaler ImageProcessor für die Regionen-Ausschnitte
         """
-        if pytesseract is None:
+        if pytesseract is None and tesserocr is None:
             raise ImportError(
                 "pytesseract ist nicht installiert. "
                 "Installiere es mit: pip install pytesseract"
             )
         
-        if tesseract_path:
+        self.use_tesserocr = tesserocr is not None
+        # PyTessBaseAPI ist nicht threadsicher: ein Satz Handles pro Thread
+        self._tess_local = threading.local()
+        
+        if tesseract_path and pytesseract is not None:
             pytesseract.pytesseract.tesseract_cmd = tesseract_path
         
         # Tesseract-Konfiguration für MTG Kartennamen
         self.config_title = '--oem 3 --psm 7 -c tessedit_char_whitelist="ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 ,\'\\"-"'
         self.config_number = '--oem 3 --psm 7 -c tessedit_char_whitelist="0123456789/"'
         self.config_general = '--oem 3 --psm 6'
+        # Titel und Sammlernummer in einem Aufruf (Block-Modus, vereinigte Whitelist)
+        self.config_fused = '--oem 3 --psm 6 -c tessedit_char_whitelist="ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789 ,/\'\\"-"'
+        
+        # CLAHE einmal (pro Thread) anlegen statt bei jedem OCR-Aufruf
+        self._clahe = ThreadLocalCLAHE(clip_limit=2.0)
+        self.processor = processor or ImageProcessor()
+    
+    def _tess_api(self, mode: str):
+        """Liefert das tesserocr-Handle dieses Threads für einen Modus"""
+        apis = getattr(self._tess_local, "apis", None)
+        if apis is None:
+            apis = self._tess_local.apis = {}
+        
+        api = apis.get(mode)
+        if api is None:
+            psm, whitelist = _TESSEROCR_MODES[mode]
+            api = tesserocr.PyTessBaseAPI(lang="eng", psm=psm)
+            if whitelist:
+                api.SetVariable("tessedit_char_whitelist", whitelist)
+            apis[mode] = api
+        return api
+    
+    def _tess_set_image(self, image: np.ndarray, mode: str):
+        """Übergibt ein Graustufenbild ohne PIL-Umweg an tesserocr"""
+        api = self._tess_api(mode)
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        api.SetImageBytes(image.tobytes(), width, height, 1, width)
+        return api
+    
+    def _image_to_data(self, image: np.ndarray, mode: str, config: str) -> dict:
+        """
+        Wortweise OCR im Format von pytesseract.image_to_data (Output.DICT)
+        
+        Args:
+            image: Vorverarbeitetes Graustufenbild
+            mode: Schlüssel in _TESSEROCR_MODES
+            config: pytesseract-Konfiguration desselben Modus
+        
+        Returns:
+            Dictionary mit den Listen "text", "conf", "top", "height"
+        """
+        if not self.use_tesserocr:
+            return pytesseract.image_to_data(
+                image, config=config, output_type=pytesseract.Output.DICT
+            )
+        
+        api = self._tess_set_image(image, mode)
+        api.Recognize()
+        
+        level = tesserocr.RIL.WORD
+        data = {"text": [], "conf": [], "top": [], "height": []}
+        for word in tesserocr.iterate_level(api.GetIterator(), level):
+            box = word.BoundingBox(level)
+            if box is None:
+                continue
+            data["text"].append(word.GetUTF8Text(level) or "")
+            data["conf"].append(word.Confidence(level))
+            data["top"].append(box[1])
+            data["height"].append(box[3] - box[1])
+        return data
+    
+    def _image_to_string(self, image: np.ndarray, mode: str, config: str) -> str:
+        """Reiner OCR-Text (wie pytesseract.image_to_string)"""
+        if not self.use_tesserocr:
+            return pytesseract.image_to_string(image, config=config)
+        
+        return self._tess_set_image(image, mode).GetUTF8Text()
     
     def _preprocess_for_ocr(self, image: np.ndarray, mode: str = "title") -> np.ndarray:
         """
@@ -48,10 +159,11 @@ class OCREngine:
             Vorverarbeitetes Bild
         """
         # In Graustufen konvertieren
+        # (keine Kopie nötig, die folgenden Schritte ändern die Eingabe nicht)
         if len(image.shape) == 3:
             gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         else:
-            gray = image.copy()
+            gray = image
         
         # Vergrößern falls zu klein
         height = gray.shape[0]
@@ -60,38 +172,39 @@ class OCREngine:
             gray = cv2.resize(gray, None, fx=scale, fy=scale, 
                             interpolation=cv2.INTER_CUBIC)
         
-        # Rauschen reduzieren
-        denoised = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
+        # Rauschen reduzieren (3x3-Median genügt für Text-Ausschnitte,
+        # NL-Means wäre um Größenordnungen teurer)
+        denoised = cv2.medianBlur(gray, 3)
         
         # Kontrast erhöhen
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        enhanced = clahe.apply(denoised)
+        enhanced = self._clahe.apply(denoised)
+        
+        # Weißer Rand: Ausgabe direkt ins Innere einer vorbelegten Fläche
+        # schreiben statt nachträglich mit copyMakeBorder umzukopieren
+        height, width = enhanced.shape
+        border = _OCR_BORDER
+        padded = np.full((height + 2 * border, width + 2 * border), 255, dtype=np.uint8)
+        interior = padded[border:border + height, border:border + width]
         
         if mode == "title":
             # Für Titel: Adaptiver Threshold
-            binary = cv2.adaptiveThreshold(
+            cv2.adaptiveThreshold(
                 enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                cv2.THRESH_BINARY, 15, 5
+                cv2.THRESH_BINARY, 15, 5, dst=interior
             )
         elif mode == "number":
             # Für Nummern: Otsu's Threshold
-            _, binary = cv2.threshold(
-                enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
+            cv2.threshold(
+                enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=interior
             )
         else:
             # Allgemein
-            binary = cv2.adaptiveThreshold(
+            cv2.adaptiveThreshold(
                 enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                cv2.THRESH_BINARY, 11, 2
+                cv2.THRESH_BINARY, 11, 2, dst=interior
             )
         
-        # Rand hinzufügen
-        binary = cv2.copyMakeBorder(
-            binary, 10, 10, 10, 10, 
-            cv2.BORDER_CONSTANT, value=255
-        )
-        
-        return binary
+        return padded
     
     def read_card_title(self, title_image: np.ndarray) -> Tuple[str, float]:
         """
@@ -107,78 +220,84 @@ class OCREngine:
         
         try:
             # OCR durchführen
-            data = pytesseract.image_to_data(
-                processed, config=self.config_title, 
-                output_type=pytesseract.Output.DICT
-            )
+            data = self._image_to_data(processed, "title", self.config_title)
             
             # Text und Konfidenz extrahieren
             words = []
             confidences = []
             
-            for i, conf in enumerate(data['conf']):
-                if int(conf) > 0:
-                    word = data['text'][i].strip()
-                    if word:
-                        words.append(word)
-                        confidences.append(int(conf))
-            
-            if not words:
-                return "", 0.0
-            
-            text = " ".join(words)
-            avg_confidence = sum(confidences) / len(confidences) / 100.0
+            for word, conf in zip(data['text'], data['conf']):
+                if (conf := int(conf)) > 0 and (word := word.strip()):
+                    words.append(word)
+                    confidences.append(conf)
             
-            # Text bereinigen
-            text = self._clean_card_name(text)
-            
-            return text, avg_confidence
+            return self._title_from_words(words, confidences)
             
         except Exception as e:
             print(f"OCR Fehler: {e}")
             return "", 0.0
     
-    def read_collector_number(self, number_image: np.ndarray) -> Tuple[str, float]:
+    def read_collector_number(self, number_image: np.ndarray) -> Tuple[str, Optional[float]]:
         """
         Liest die Sammlernummer
         
+        Nur Text per image_to_string, ohne wortweise Konfidenzen: die zweite
+        Komponente ist daher immer None (nicht gemessen). Wer eine gemessene
+        Konfidenz braucht, nimmt extract_all_text.
+        
         Args:
             number_image: Bild des Nummernbereichs
         
         Returns:
-            Tuple aus (Sammlernummer, Konfidenz)
+            Tuple aus (Sammlernummer, None)
         """
         processed = self._preprocess_for_ocr(number_image, mode="number")
         
         try:
-            data = pytesseract.image_to_data(
-                processed, config=self.config_number,
-                output_type=pytesseract.Output.DICT
-            )
-            
-            text = ""
-            confidence = 0.0
+            # Nur Text, kein Layout: die Nummer wird ohnehin per Regex geprüft
+            text = "".join(self._image_to_string(
+                processed, "number", self.config_number
+            ).split())
             
-            for i, conf in enumerate(data['conf']):
-                if int(conf) > 0:
-                    word = data['text'][i].strip()
-                    if word:
-                        text += word
-                        confidence = max(confidence, int(conf) / 100.0)
-            
-            # Sammlernummer extrahieren (Format: XXX/YYY oder nur XXX)
-            match = re.search(r'(\d+)(?:/(\d+))?', text)
+            # Sammlernummer extrahieren
+            match = _COLLECTOR_RE.search(text)
             if match:
-                collector_number = match.group(1)
-                if match.group(2):
-                    collector_number += "/" + match.group(2)
-                return collector_number, confidence
+                return self._format_collector_number(match), None
             
-            return text, confidence
+            return text, None
             
         except Exception as e:
             print(f"OCR Fehler bei Sammlernummer: {e}")
+            return "", None
+    
+    def _title_from_words(self, words: List[str], confidences: List[int]) -> Tuple[str, float]:
+        """Setzt den Kartennamen aus OCR-Wörtern zusammen (mittlere Konfidenz)"""
+        if not words:
             return "", 0.0
+        
+        avg_confidence = sum(confidences) / len(confidences) / 100.0
+        return self._clean_card_name(" ".join(words)), avg_confidence
+    
+    def _collector_number_from_words(self, words: List[str],
+                                     confidences: List[int]) -> Tuple[str, float]:
+        """Setzt die Sammlernummer aus OCR-Wörtern zusammen (höchste Konfidenz)"""
+        text = "".join(words)
+        confidence = max(confidences, default=0) / 100.0
+        
+        # Sammlernummer extrahieren
+        match = _COLLECTOR_RE.search(text)
+        if match:
+            return self._format_collector_number(match), confidence
+        
+        return text, confidence
+    
+    @staticmethod
+    def _format_collector_number(match: "re.Match") -> str:
+        """Sammlernummer aus einem _COLLECTOR_RE-Treffer (Format: XXX/YYY oder nur XXX)"""
+        collector_number = match.group(1)
+        if match.group(2):
+            collector_number += "/" + match.group(2)
+        return collector_number
     
     def read_set_info(self, info_image: np.ndarray) -> Tuple[str, float]:
         """
@@ -193,12 +312,12 @@ class OCREngine:
         processed = self._preprocess_for_ocr(info_image, mode="general")
         
         try:
-            text = pytesseract.image_to_string(
-                processed, config=self.config_general
+            text = self._image_to_string(
+                processed, "general", self.config_general
             ).strip()
             
-            # Set-Code extrahieren (3-4 Großbuchstaben)
-            match = re.search(r'[A-Z]{3,4}', text)
+            # Set-Code extrahieren - search() bricht beim ersten Treffer ab
+            match = _SET_CODE_RE.search(text)
             if match:
                 return match.group(), 0.8
             
@@ -218,61 +337,83 @@ class OCREngine:
         Returns:
             Bereinigter Kartenname
         """
-        # Entferne unerwünschte Zeichen
-        text = re.sub(r'[^a-zA-Z0-9\s,\'\"-]', '', text)
-        
-        # Mehrfache Leerzeichen entfernen
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Trimmen
-        text = text.strip()
-        
-        # Häufige OCR-Fehler korrigieren
-        corrections = {
-            '0': 'O',  # Null zu O
-            '1': 'l',  # Eins zu l (in Namen)
-            '|': 'l',  # Pipe zu l
-        }
-        
-        # Wörter mit korrekter Großschreibung
-        words = text.split()
-        corrected_words = []
-        
-        for word in words:
-            # Erstes Zeichen groß, Rest klein (Standard für Namen)
-            if word:
-                corrected_word = word[0].upper() + word[1:].lower() if len(word) > 1 else word.upper()
-                corrected_words.append(corrected_word)
-        
-        return " ".join(corrected_words)
+        # Unerwünschte Zeichen entfernen, "|" zu "l" (ein Tabellen-Durchlauf);
+        # die Regex wird nur für übrige Nicht-ASCII-Zeichen gebraucht
+        text = text.translate(_CLEAN_ASCII_TABLE)
+        if not text.isascii():
+            text = _CLEAN_RE.sub('', text)
+        
+        # Erstes Zeichen groß, Rest klein (Standard für Namen); split() fasst
+        # Leerzeichen zusammen und trimmt
+        return " ".join(word.capitalize() for word in text.split())
     
-    def extract_all_text(self, card_image: np.ndarray) -> dict:
+    def extract_all_text(self, card_image: np.ndarray,
+                         gray: Optional[np.ndarray] = None) -> dict:
         """
         Extrahiert alle Textinformationen von einer Karte
         
         Args:
             card_image: Vollständiges Kartenbild
+            gray: Optional dieselbe Karte in Graustufen (z.B. aus
+                  ImageProcessor.extract_card_and_gray)
         
         Returns:
             Dictionary mit allen erkannten Texten
         """
-        from .image_processor import ImageProcessor
-        processor = ImageProcessor()
+        processor = self.processor
         
         results = {
             "title": {"text": "", "confidence": 0.0},
             "collector_number": {"text": "", "confidence": 0.0}
         }
         
-        # Titel extrahieren
-        title_region = processor.extract_title_region(card_image)
-        title, title_conf = self.read_card_title(title_region)
+        # Einmal für die ganze Karte in Graustufen umrechnen; die Ausschnitte
+        # werden dann einkanalig ausgeschnitten und vergrößert
+        if gray is None:
+            gray = cv2.cvtColor(card_image, cv2.COLOR_BGR2GRAY) if card_image.ndim == 3 else card_image
+        
+        title_image = self._preprocess_for_ocr(
+            processor.extract_title_region(gray), mode="title"
+        )
+        number_image = self._preprocess_for_ocr(
+            processor.extract_collector_number_region(gray), mode="number"
+        )
+        
+        # Beide Ausschnitte untereinander auf eine weiße Fläche legen:
+        # ein Tesseract-Aufruf statt zwei (jeder startet einen eigenen Prozess)
+        split_y = title_image.shape[0] + _FUSED_GAP
+        width = max(title_image.shape[1], number_image.shape[1])
+        canvas = np.full((split_y + number_image.shape[0], width), 255, dtype=np.uint8)
+        canvas[:title_image.shape[0], :title_image.shape[1]] = title_image
+        canvas[split_y:, :number_image.shape[1]] = number_image
+        
+        try:
+            data = self._image_to_data(canvas, "fused", self.config_fused)
+        except Exception as e:
+            print(f"OCR Fehler: {e}")
+            return results
+        
+        # Wörter anhand ihrer vertikalen Mitte dem Ausschnitt zuordnen
+        title_words, title_confidences = [], []
+        number_words, number_confidences = [], []
+        
+        for word, conf, top, height in zip(data['text'], data['conf'],
+                                           data['top'], data['height']):
+            if (conf := int(conf)) > 0 and (word := word.strip()):
+                if top + height / 2 < split_y:
+                    title_words.append(word)
+                    title_confidences.append(conf)
+                else:
+                    number_words.append(word)
+                    number_confidences.append(conf)
+        
+        # Titel
+        title, title_conf = self._title_from_words(title_words, title_confidences)
         results["title"]["text"] = title
         results["title"]["confidence"] = title_conf
         
-        # Sammlernummer extrahieren
-        number_region = processor.extract_collector_number_region(card_image)
-        number, number_conf = self.read_collector_number(number_region)
+        # Sammlernummer
+        number, number_conf = self._collector_number_from_words(number_words, number_confidences)
         results["collector_number"]["text"] = number
         results["collector_number"]["confidence"] = number_conf
         
@@ -286,6 +427,8 @@ class OCREngine:
             True wenn Tesseract funktioniert
         """
         try:
+            if self.use_tesserocr:
+                return bool(tesserocr.tesseract_version())
             pytesseract.get_tesseract_version()
             return True
         except Exception:
@@ -6,11 +6,35 @@ import cv2
 import numpy as np
 from typing import Optional, Dict, List, Union
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from difflib import SequenceMatcher
+from operator import itemgetter
+try:
+    from rapidfuzz import fuzz
+except ImportError:
+    fuzz = None
 
 from .image_processor import ImageProcessor
 from .ocr_engine import OCREngine
 from .scryfall_api import ScryfallAPI
-from .card_matcher import CardMatcher
+from .card_matcher import CardMatcher, COLLECTOR_NUMBER_SCORE
+from .name_index import CardNameIndex
+from .result import RecognitionResult
+
+# Felder eines Treffers in result.all_matches (ohne die vollständigen Kartendaten)
+_MATCH_FIELDS = ("set_name", "set_code", "collector_number", "score")
+_match_values = itemgetter(*_MATCH_FIELDS)
+
+# Darunter wird der Sammlernummer bzw. dem Kartenausschnitt nicht vertraut
+_MIN_NUMBER_CONFIDENCE = 0.6
+_MIN_EXTRACTION_CONFIDENCE = 0.3
+
+# Längste Bildseite für Webcam-Aufnahmen
+_WEBCAM_MAX_SIDE = 1280
+
+# Ab dieser Länge toleriert die lokale Namenskorrektur zwei Tippfehler
+_MIN_LEN_DISTANCE_2 = 8
 
 
 class MTGCardRecognizer:
@@ -21,19 +45,31 @@ class MTGCardRecognizer:
     präzise Kartenerkennung und Versionsidentifikation.
     """
     
-    def __init__(self, tesseract_path: Optional[str] = None):
+    def __init__(self, tesseract_path: Optional[str] = None,
+                 bulk: Union[bool, str] = False, use_opencl: bool = False):
         """
         Initialisiert den Erkenner
         
         Args:
             tesseract_path: Optionaler Pfad zur Tesseract-Executable
+            bulk: Scryfalls Bulk-Daten vorab laden (lohnt sich bei vielen
+                  Karten); True für die aktuellen default_cards, ein String
+                  für eine lokale JSON-Datei oder Download-URL
+            use_opencl: Bildvorverarbeitung per OpenCL auf der GPU, sofern
+                        ein OpenCL-Gerät verfügbar ist
         """
-        self.processor = ImageProcessor()
+        self.processor = ImageProcessor(use_opencl=use_opencl)
         self.api = ScryfallAPI()
         self.matcher = CardMatcher(self.api)
+        if bulk:
+            loaded = self.matcher.load_bulk(bulk if isinstance(bulk, str) else None)
+            if not loaded:
+                print("Warnung: Bulk-Daten nicht verfügbar, nutze die API pro Karte.")
+        self._name_index = None  # wird beim ersten Bedarf geladen
+        self._name_index_lock = threading.Lock()
         
         try:
-            self.ocr = OCREngine(tesseract_path)
+            self.ocr = OCREngine(tesseract_path, processor=self.processor)
             self.ocr_available = self.ocr.is_tesseract_available()
         except ImportError:
             self.ocr = None
@@ -54,102 +90,93 @@ class MTGCardRecognizer:
         Returns:
             Dictionary mit Erkennungsergebnis
         """
-        result = {
-            "success": False,
-            "name": None,
-            "set_name": None,
-            "set_code": None,
-            "collector_number": None,
-            "confidence": 0.0,
-            "all_matches": [],
-            "image_url": None,
-            "scryfall_uri": None,
-            "error": None
-        }
+        result = RecognitionResult()
         
         # 1. Bild laden
         image = self._load_image(image_source)
         if image is None:
-            result["error"] = "Bild konnte nicht geladen werden"
-            return result
+            result.error = "Bild konnte nicht geladen werden"
+            return result.to_dict()
         
         # 2. Kartenregion extrahieren
-        card_image, extraction_confidence = self.processor.extract_card_region(image)
+        card_image, card_gray, extraction_confidence = self.processor.extract_card_and_gray(image)
         if card_image is None:
-            result["error"] = "Keine Karte im Bild erkannt"
-            return result
+            result.error = "Keine Karte im Bild erkannt"
+            return result.to_dict()
         
         # 3. Kartenname ermitteln
         card_name = None
         name_confidence = 0.0
         collector_number = None
+        number_confidence = 0.0
         
         if use_ocr and self.ocr_available:
             # OCR verwenden
-            ocr_result = self.ocr.extract_all_text(card_image)
+            ocr_result = self.ocr.extract_all_text(card_image, gray=card_gray)
             
             card_name = ocr_result["title"]["text"]
             name_confidence = ocr_result["title"]["confidence"]
             collector_number = ocr_result["collector_number"]["text"]
+            number_confidence = ocr_result["collector_number"]["confidence"]
             
             # Name mit API verifizieren/korrigieren
             if card_name:
                 card_name = self._verify_card_name(card_name)
         
         if not card_name:
-            result["error"] = "Kartenname konnte nicht erkannt werden. Bitte manuell eingeben."
-            return result
+            result.error = "Kartenname konnte nicht erkannt werden. Bitte manuell eingeben."
+            return result.to_dict()
         
-        result["name"] = card_name
+        result.name = card_name
         
-        # 4. Karte in Scryfall suchen
-        card_data = self.api.get_card_by_name(card_name)
+        # 4. Karte in Scryfall suchen (für die Versionserkennung samt aller Prints)
+        if match_version:
+            card_data = self.api.get_card_with_prints(card_name)
+        else:
+            card_data = self.api.get_card_by_name(card_name)
         if not card_data:
-            result["error"] = f"Karte '{card_name}' nicht in Datenbank gefunden"
-            return result
+            result.error = f"Karte '{card_name}' nicht in Datenbank gefunden"
+            return result.to_dict()
         
         # Korrigierten Namen verwenden
-        result["name"] = card_data.get("name", card_name)
+        result.name = card_data.get("name", card_name)
         
         # 5. Exakte Version identifizieren
-        if match_version:
-            # Erst mit Sammlernummer versuchen
-            if collector_number:
-                version = self.matcher.identify_version_from_collector_number(
-                    result["name"], collector_number
-                )
-                if version:
-                    self._fill_result(result, version, 0.95)
-                    return result
-            
-            # Bildvergleich für Versionserkennung
-            matches = self.matcher.find_best_match(result["name"], card_image)
+        # Erst mit Sammlernummer versuchen (nur wenn die OCR sich sicher ist)
+        version = None
+        if match_version and collector_number and number_confidence > _MIN_NUMBER_CONFIDENCE:
+            version = self.matcher.identify_version_from_collector_number(
+                result.name, collector_number
+            )
+        
+        if version:
+            self._fill_result(result, version, COLLECTOR_NUMBER_SCORE)
+        elif match_version and extraction_confidence >= _MIN_EXTRACTION_CONFIDENCE:
+            # Bildvergleich für Versionserkennung; auch eine unsichere Sammlernummer
+            # grenzt die Kandidaten ein und spart so Referenz-Downloads
+            hints = self._number_hints(collector_number, number_confidence)
+            matches = self.matcher.find_best_match(result.name, card_image,
+                                                   hints=hints, gray=card_gray)
             
             if matches:
                 best_match = matches[0]
                 self._fill_result(result, best_match["card"], best_match["score"])
-                result["all_matches"] = [
-                    {
-                        "set_name": m["set_name"],
-                        "set_code": m["set_code"],
-                        "collector_number": m["collector_number"],
-                        "score": m["score"]
-                    }
-                    for m in matches
+                result.all_matches = [
+                    dict(zip(_MATCH_FIELDS, _match_values(m))) for m in matches
                 ]
         else:
-            # Nur erste gefundene Version
+            # Nur erste gefundene Version (zu unsicherer Ausschnitt lohnt keine Downloads)
             self._fill_result(result, card_data, 0.7)
         
         # Gesamtkonfidenz berechnen
-        result["confidence"] = (
+        result.confidence = (
             extraction_confidence * 0.3 +
             name_confidence * 0.3 +
-            result["confidence"] * 0.4
+            result.confidence * 0.4
         )
         
-        result["success"] = True
-        return result
+        result.success = True
+        return result.to_dict()
     
     def recognize_from_name(self, card_name: str, 
                            image_source: Optional[Union[str, np.ndarray, bytes]] = None) -> Dict:
@@ -163,46 +190,44 @@ class MTGCardRecognizer:
         Returns:
             Erkennungsergebnis
         """
-        result = {
-            "success": False,
-            "name": card_name,
-            "set_name": None,
-            "set_code": None,
-            "collector_number": None,
-            "confidence": 0.0,
-            "all_matches": [],
-            "image_url": None,
-            "scryfall_uri": None,
-            "error": None
-        }
+        result = RecognitionResult(name=card_name)
         
         # Karte in API suchen
         card_data = self.api.get_card_by_name(card_name)
         if not card_data:
-            result["error"] = f"Karte '{card_name}' nicht gefunden"
-            return result
+            result.error = f"Karte '{card_name}' nicht gefunden"
+            return result.to_dict()
         
-        result["name"] = card_data.get("name", card_name)
+        result.name = card_data.get("name", card_name)
         
         if image_source:
             # Bild für Versionserkennung verwenden
             image = self._load_image(image_source)
             if image is not None:
-                card_image, _ = self.processor.extract_card_region(image)
+                card_image, card_gray, _ = self.processor.extract_card_and_gray(image)
                 if card_image is not None:
-                    matches = self.matcher.find_best_match(result["name"], card_image)
+                    # Nur die Sammlernummer lesen (der Name ist bekannt); sie grenzt
+                    # die Versionen ohne Referenz-Downloads ein
+                    hints = None
+                    if self.ocr_available:
+                        number, number_confidence = self.ocr.read_collector_number(
+                            self.processor.extract_collector_number_region(card_gray)
+                        )
+                        hints = self._number_hints(number, number_confidence)
+                    matches = self.matcher.find_best_match(result.name, card_image,
+                                                           hints=hints, gray=card_gray)
                     if matches:
                         best = matches[0]
                         self._fill_result(result, best["card"], best["score"])
-                        result["success"] = True
-                        return result
+                        result.success = True
+                        return result.to_dict()
         
         # Alle Versionen auflisten
-        all_prints = self.api.get_all_prints(result["name"])
+        all_prints = self.api.get_all_prints(result.name)
         if all_prints:
             # Erste (neueste) Version verwenden
             self._fill_result(result, all_prints[0], 0.8)
-            result["all_matches"] = [
+            result.all_matches = [
                 {
                     "set_name": p.get("set_name"),
                     "set_code": p.get("set"),
@@ -212,8 +237,8 @@ class MTGCardRecognizer:
                 for p in all_prints[:10]
             ]
         
-        result["success"] = True
-        return result
+        result.success = True
+        return result.to_dict()
     
     def get_all_versions(self, card_name: str) -> List[Dict]:
         """
@@ -243,6 +268,29 @@ class MTGCardRecognizer:
         
         return versions
     
+    @staticmethod
+    def _number_hints(collector_number: Optional[str],
+                      confidence: Optional[float]) -> Optional[Dict]:
+        """
+        Baut die Hinweise für find_best_match aus einer OCR-Sammlernummer
+        
+        Eine unsichere oder nicht gemessene Nummer grenzt die Kandidaten nur
+        ein; den Bildvergleich ersetzt sie nicht.
+        
+        Args:
+            collector_number: OCR-Sammlernummer
+            confidence: Gemessene Konfidenz der OCR (None: nicht gemessen)
+        
+        Returns:
+            Hinweis-Dictionary oder None ohne Nummer
+        """
+        if not collector_number:
+            return None
+        return {
+            "collector_number": collector_number,
+            "number_trusted": confidence is not None and confidence > _MIN_NUMBER_CONFIDENCE
+        }
+    
     def _load_image(self, source: Union[str, np.ndarray, bytes]) -> Optional[np.ndarray]:
         """Lädt Bild aus verschiedenen Quellen"""
         if isinstance(source, np.ndarray):
@@ -264,6 +312,21 @@ class MTGCardRecognizer:
         Returns:
             Verifizierter/korrigierter Name
         """
+        # Zuerst lokal: exakter Name oder bis zu zwei OCR-Fehler ("Counterspel1")
+        name_index = self._get_name_index()
+        if name_index is not None:
+            name = name_index.lookup(ocr_name)
+            if name:
+                return name
+            
+            corrections = name_index.correct_with_distance(ocr_name, max_distance=1, limit=2)
+            # Zwei Fehler nur bei längeren Namen, sonst passen zu viele fremde Karten
+            if not corrections and len(ocr_name) >= _MIN_LEN_DISTANCE_2:
+                corrections = name_index.correct_with_distance(ocr_name, max_distance=2, limit=2)
+            # Nur eindeutige Korrekturen; bei Gleichstand entscheidet die API
+            if corrections and (len(corrections) == 1 or corrections[0][0] < corrections[1][0]):
+                return corrections[0][1]
+        
         # Autovervollständigung verwenden
         suggestions = self.api.autocomplete(ocr_name)
         
@@ -282,36 +345,36 @@ class MTGCardRecognizer:
         
         return ocr_name
     
+    def _get_name_index(self) -> Optional[CardNameIndex]:
+        """
+        Liefert den lokalen Namensindex (einmal geladen, Katalog auf der Festplatte gecacht)
+        
+        Returns:
+            CardNameIndex oder None wenn der Katalog nicht verfügbar ist
+        """
+        # Lock: bei paralleler Erkennung den Katalog nur einmal laden
+        with self._name_index_lock:
+            if self._name_index is None:
+                self._name_index = CardNameIndex.from_api(self.api)
+        return self._name_index
+    
     def _string_similarity(self, s1: str, s2: str) -> float:
-        """Berechnet Ähnlichkeit zwischen zwei Strings"""
+        """Berechnet Ähnlichkeit zwischen zwei Strings (0.0 - 1.0)"""
         s1, s2 = s1.lower(), s2.lower()
         
         if s1 == s2:
             return 1.0
         
-        # Levenshtein-basierte Ähnlichkeit (vereinfacht)
-        len1, len2 = len(s1), len(s2)
-        max_len = max(len1, len2)
-        
-        if max_len == 0:
-            return 1.0
-        
-        # Gemeinsame Zeichen zählen
-        common = sum(1 for c in s1 if c in s2)
+        # Normierte Levenshtein-Ähnlichkeit (rapidfuzz, bitparallel in C)
+        if fuzz is not None:
+            return fuzz.ratio(s1, s2) / 100.0
         
-        return common / max_len
+        # Fallback ohne rapidfuzz: difflib (ebenfalls in C beschleunigt)
+        return SequenceMatcher(None, s1, s2).ratio()
     
-    def _fill_result(self, result: Dict, card_data: Dict, confidence: float):
-        """Füllt Ergebnis-Dictionary mit Kartendaten"""
-        result["name"] = card_data.get("name")
-        result["set_name"] = card_data.get("set_name")
-        result["set_code"] = card_data.get("set")
-        result["collector_number"] = card_data.get("collector_number")
-        result["rarity"] = card_data.get("rarity")
-        result["confidence"] = confidence
-        result["image_url"] = self.api.get_card_image_url(card_data)
-        result["scryfall_uri"] = card_data.get("scryfall_uri")
-        result["prices"] = card_data.get("prices", {})
+    def _fill_result(self, result: RecognitionResult, card_data: Dict, confidence: float):
+        """Füllt das Ergebnis mit Kartendaten"""
+        result.fill(card_data, confidence, self.api.get_card_image_url(card_data))
     
     def recognize_from_webcam(self, camera_id: int = 0) -> Dict:
         """
@@ -328,6 +391,10 @@ class MTGCardRecognizer:
         if not cap.isOpened():
             return {"success": False, "error": "Kamera konnte nicht geöffnet werden"}
         
+        # 720p reicht für die Erkennung; kleinere Frames entlasten auch die Vorschau
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, _WEBCAM_MAX_SIDE)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+        
         print("Webcam aktiv. Drücke 'SPACE' zum Erfassen, 'Q' zum Beenden.")
         
         captured_image = None
@@ -337,17 +404,25 @@ class MTGCardRecognizer:
             if not ret:
                 break
             
-            # Vorschau anzeigen
-            display = frame.copy()
-            cv2.putText(display, "SPACE: Erfassen | Q: Beenden", 
+            # Vorschau anzeigen: Hinweis direkt in den Frame zeichnen und danach
+            # nur den Textstreifen wiederherstellen statt den ganzen Frame zu kopieren
+            text_strip = frame[:40].copy()
+            cv2.putText(frame, "SPACE: Erfassen | Q: Beenden", 
                        (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
             
-            cv2.imshow("MTG Card Scanner", display)
+            cv2.imshow("MTG Card Scanner", frame)
+            frame[:40] = text_strip
             
             key = cv2.waitKey(1) & 0xFF
             
             if key == ord(' '):
                 captured_image = frame.copy()
+                # Falls die Kamera die Auflösung ignoriert: OCR-Aufwand wächst mit der Pixelzahl
+                h, w = captured_image.shape[:2]
+                scale = _WEBCAM_MAX_SIDE / max(h, w)
+                if scale < 1:
+                    captured_image = cv2.resize(captured_image, None, fx=scale, fy=scale,
+                                                interpolation=cv2.INTER_AREA)
                 break
             elif key == ord('q'):
                 break
@@ -361,22 +436,30 @@ class MTGCardRecognizer:
         return {"success": False, "error": "Keine Aufnahme gemacht"}
     
     def batch_recognize(self, image_sources: List[Union[str, np.ndarray, bytes]],
-                       use_ocr: bool = True) -> List[Dict]:
+                       use_ocr: bool = True, workers: int = 8) -> List[Dict]:
         """
-        Erkennt mehrere Karten
+        Erkennt mehrere Karten parallel
+        
+        Die Arbeit pro Karte besteht aus HTTP-Anfragen, OpenCV und dem
+        Tesseract-Prozess, die alle ohne GIL laufen - Threads genügen.
         
         Args:
             image_sources: Liste von Bildquellen
             use_ocr: OCR verwenden
+            workers: Anzahl paralleler Threads
         
         Returns:
-            Liste von Erkennungsergebnissen
+            Liste von Erkennungsergebnissen (in Reihenfolge der Eingabe)
         """
-        results = []
+        total = len(image_sources)
+        
+        def recognize(indexed_source):
+            i, source = indexed_source
+            print(f"Verarbeite Karte {i+1}/{total}...")
+            return self.recognize_card(source, use_ocr=use_ocr)
         
-        for i, source in enumerate(image_sources):
-            print(f"Verarbeite Karte {i+1}/{len(image_sources)}...")
-            result = self.recognize_card(source, use_ocr=use_ocr)
-            results.append(result)
+        if total < 2 or workers < 2:
+            return [recognize(item) for item in enumerate(image_sources)]
         
-        return results
+        with ThreadPoolExecutor(max_workers=min(workers, total)) as executor:
+            return list(executor.map(recognize, enumerate(image_sources)))
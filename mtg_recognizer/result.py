@@ -0,0 +1,51 @@
+"""
+Ergebnistyp der MTG Kartenerkennung
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class RecognitionResult:
+    """
+    Erkennungsergebnis während der Verarbeitung
+    
+    Die öffentlichen Methoden geben weiterhin Dictionaries zurück
+    (to_dict), die Felder entsprechen deren Schlüsseln.
+    """
+    success: bool = False
+    name: Optional[str] = None
+    set_name: Optional[str] = None
+    set_code: Optional[str] = None
+    collector_number: Optional[str] = None
+    confidence: float = 0.0
+    all_matches: List[Dict] = field(default_factory=list)
+    image_url: Optional[str] = None
+    scryfall_uri: Optional[str] = None
+    error: Optional[str] = None
+    rarity: Optional[str] = None
+    prices: Dict[str, Any] = field(default_factory=dict)
+    
+    def fill(self, card_data: Dict, confidence: float, image_url: Optional[str]):
+        """
+        Übernimmt die Daten einer Scryfall-Kartenversion
+        
+        Args:
+            card_data: Kartendaten von Scryfall
+            confidence: Konfidenz der Versionserkennung
+            image_url: Bild-URL der Version
+        """
+        self.name = card_data.get("name")
+        self.set_name = card_data.get("set_name")
+        self.set_code = card_data.get("set")
+        self.collector_number = card_data.get("collector_number")
+        self.rarity = card_data.get("rarity")
+        self.confidence = confidence
+        self.image_url = image_url
+        self.scryfall_uri = card_data.get("scryfall_uri")
+        self.prices = card_data.get("prices", {})
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Flache Kopie als Dictionary (im Gegensatz zu asdict ohne tiefe Kopie)"""
+        return dict(vars(self))
@@ -3,9 +3,52 @@ Scryfall API Client für MTG Karteninformationen
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
-from typing import Optional, List, Dict, Any
-from urllib.parse import quote
+import threading
+from collections import deque
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, Iterator, Callable
+from urllib.parse import quote, urlencode
+
+from .cache import DiskCache
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Kartendaten ändern sich selten (Preise täglich)
+API_CACHE_EXPIRE = 24 * 3600
+
+# Scryfall erlaubt durchschnittlich 10 Anfragen pro Sekunde
+RATE_LIMIT_REQUESTS = 10
+RATE_LIMIT_WINDOW = 1.0
+
+# Wiederholungen bei Überlast/Serverfehlern (für beide HTTP-Clients)
+RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.2
+RETRY_MAX_WAIT = 30.0
+
+# Fehler beider HTTP-Clients (ValueError: ungültiges JSON)
+_HTTP_ERRORS = (requests.RequestException, ValueError)
+if httpx is not None:
+    _HTTP_ERRORS += (httpx.HTTPError,)
+
+
+def _json(response):
+    """Parst eine JSON-Antwort - mit orjson (schneller bei großen Suchergebnissen) falls installiert"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
 
 
 class ScryfallAPI:
@@ -13,74 +56,198 @@ class ScryfallAPI:
     
     BASE_URL = "https://api.scryfall.com"
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
+    def __init__(self, cache: Optional[DiskCache] = None):
+        """
+        Initialisiert den API-Client
+        
+        Args:
+            cache: Optionaler persistenter Cache für API-Antworten
+        """
+        self.session = self._create_session({
             "User-Agent": "MTGCardRecognizer/1.0",
             "Accept": "application/json"
         })
-        self._last_request_time = 0
-        self._rate_limit_delay = 0.1  # 100ms zwischen Requests (Scryfall Limit)
+        # Zeitpunkte der Requests im letzten Zeitfenster (Scryfall: 10 pro Sekunde)
+        self._bucket = deque()
+        self._rate_limit_lock = threading.Lock()
+        self._prints_cache = {}  # normalisierter Name -> Liste aller Versionen
+        self._cache = cache if cache is not None else DiskCache("scryfall")
+        # Pro Instanz, damit der Cache nicht über das Objekt hinaus lebt
+        self._autocomplete_cached = lru_cache(maxsize=4096)(self._fetch_autocomplete)
+        # Für voneinander unabhängige Anfragen (Threads entstehen erst bei Bedarf)
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="scryfall")
+    
+    @staticmethod
+    def _create_session(headers: Dict[str, str]):
+        """
+        Erstellt den HTTP-Client
+        
+        Mit httpx[http2] teilen sich parallele Anfragen eine HTTP/2-Verbindung
+        (ein TLS-Handshake statt einem pro Verbindung). Sonst requests mit
+        Connection-Pooling (Keep-Alive). Beide Clients wiederholen nur
+        Verbindungsfehler selbst, 429/5xx behandelt _send.
+        """
+        if httpx is not None:
+            limits = httpx.Limits(max_keepalive_connections=20, max_connections=50)
+            try:
+                return httpx.Client(
+                    http2=True,
+                    headers=headers,
+                    timeout=10,
+                    follow_redirects=True,
+                    transport=httpx.HTTPTransport(http2=True, retries=3, limits=limits)
+                )
+            except ImportError:
+                # httpx ohne das h2-Paket
+                pass
+        
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=10,
+            pool_maxsize=20,
+            max_retries=Retry(total=MAX_RETRIES, backoff_factor=RETRY_BACKOFF)
+        )
+        session.mount("https://", adapter)
+        session.headers.update(headers)
+        return session
     
     def _rate_limit(self):
-        """Implementiert Rate Limiting für die API"""
-        elapsed = time.time() - self._last_request_time
-        if elapsed < self._rate_limit_delay:
-            time.sleep(self._rate_limit_delay - elapsed)
-        self._last_request_time = time.time()
+        """
+        Implementiert Rate Limiting für die API (threadsicher)
+        
+        Gleitendes Fenster: bis zu RATE_LIMIT_REQUESTS Anfragen starten sofort,
+        erst die nächste wartet, bis die älteste aus dem Fenster fällt.
+        """
+        while True:
+            with self._rate_limit_lock:
+                now = time.monotonic()
+                while self._bucket and now - self._bucket[0] >= RATE_LIMIT_WINDOW:
+                    self._bucket.popleft()
+                if len(self._bucket) < RATE_LIMIT_REQUESTS:
+                    self._bucket.append(now)
+                    return
+                wait = RATE_LIMIT_WINDOW - (now - self._bucket[0])
+            # Außerhalb des Locks warten, damit andere Threads weiter prüfen können
+            time.sleep(wait)
+    
+    def _send(self, url: str, **kwargs):
+        """
+        GET mit Wiederholung bei 429/5xx (exponentielles Backoff, Retry-After)
+        
+        Anfragen an die API laufen bei jedem Versuch durch das Rate Limit.
+        Die letzte Antwort wird unverändert zurückgegeben, raise_for_status
+        bleibt Sache des Aufrufers.
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            if url.startswith(self.BASE_URL):
+                self._rate_limit()
+            response = self.session.get(url, **kwargs)
+            if response.status_code not in RETRY_STATUS or attempt == MAX_RETRIES:
+                return response
+            time.sleep(self._retry_delay(response, attempt))
+    
+    @staticmethod
+    def _retry_delay(response, attempt: int) -> float:
+        """Wartezeit vor dem nächsten Versuch: Retry-After, sonst Backoff"""
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                # HTTP-Datum statt Sekunden
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    delay = None
+            if delay is not None:
+                return min(max(delay, 0.0), RETRY_MAX_WAIT)
+        return RETRY_BACKOFF * (2 ** attempt)
     
     def _get(self, endpoint: str, params: Optional[Dict] = None) -> Optional[Dict]:
-        """Führt einen GET-Request durch"""
-        self._rate_limit()
+        """Führt einen GET-Request gegen die API durch (Antworten 24h gecacht)"""
+        return self._get_url(f"{self.BASE_URL}{endpoint}", params)
+    
+    def _get_url(self, url: str, params: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        GET-Request auf eine absolute URL (z.B. next_page, prints_search_uri)
+        
+        Args:
+            url: Vollständige URL
+            params: Query-Parameter
+        
+        Returns:
+            JSON-Antwort oder None bei Fehlern
+        """
+        cache_key = f"{url}?{urlencode(sorted(params.items()))}" if params else url
+        entry, fresh = self._cache.get_stale(cache_key)
+        # Einträge sind (ETag, Antwort); ältere Caches enthalten nur die Antwort
+        etag, cached = entry if isinstance(entry, tuple) else (None, entry)
+        if cached is not None and fresh:
+            return cached
+        
+        # Abgelaufen, aber mit ETag: Scryfall antwortet bei unveränderten Daten mit 304
+        headers = {"If-None-Match": etag} if etag and cached is not None else None
+        
         try:
-            response = self.session.get(f"{self.BASE_URL}{endpoint}", params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
+            response = self._send(url, params=params, headers=headers)
+            if response.status_code == 304:
+                data = cached
+            else:
+                response.raise_for_status()
+                data = _json(response)
+                etag = response.headers.get("ETag")
+        except _HTTP_ERRORS as e:
             print(f"API Fehler: {e}")
             return None
+        
+        self._cache.set(cache_key, (etag, data), expire=API_CACHE_EXPIRE)
+        return data
     
-    def search_cards(self, query: str, unique: str = "cards") -> List[Dict]:
+    def search_cards(self, query: str, unique: str = "cards", order: Optional[str] = None) -> List[Dict]:
         """
         Sucht nach Karten basierend auf einer Suchanfrage
         
         Args:
             query: Suchbegriff (z.B. Kartenname)
             unique: "cards", "art", oder "prints" für verschiedene Ergebnistypen
+            order: Optionale Sortierung (z.B. "released", absteigend)
         
         Returns:
             Liste von Kartendaten
         """
-        cards = []
+        return list(self._iter_search_cards(query, unique, order))
+    
+    def _iter_search_cards(self, query: str, unique: str = "cards",
+                           order: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Liefert Suchergebnisse einzeln und lädt Folgeseiten erst bei Bedarf
+        
+        Wer nur den ersten Treffer braucht, löst so nur eine Anfrage aus.
+        """
         params = {"q": query, "unique": unique}
+        if order:
+            params.update({"order": order, "dir": "desc"})
         
         data = self._get("/cards/search", params)
-        if not data:
-            return cards
-        
-        cards.extend(data.get("data", []))
-        
-        # Paginierung
-        while data and data.get("has_more"):
+        yield from self._iter_pages(data)
+    
+    def _iter_pages(self, data: Optional[Dict]) -> Iterator[Dict]:
+        """Iteriert über eine Listenantwort samt Paginierung"""
+        while data:
+            yield from data.get("data", [])
+            
             next_page = data.get("next_page")
-            if next_page:
-                self._rate_limit()
-                try:
-                    response = self.session.get(next_page)
-                    response.raise_for_status()
-                    data = response.json()
-                    cards.extend(data.get("data", []))
-                except:
-                    break
-            else:
+            if not data.get("has_more") or not next_page:
                 break
-        
-        return cards
+            data = self._get_url(next_page)
     
     def get_card_by_name(self, name: str, fuzzy: bool = True) -> Optional[Dict]:
         """
         Findet eine Karte nach Namen
         
+        Bereits bekannte Namen (Bulk-Daten oder früher geladene Prints)
+        werden lokal mit der neuesten Version beantwortet.
+        
         Args:
             name: Kartenname
             fuzzy: Wenn True, wird unscharfe Suche verwendet
@@ -88,20 +255,81 @@ class ScryfallAPI:
         Returns:
             Kartendaten oder None
         """
+        prints = self._prints_cache.get(" ".join(name.split()).lower())
+        if prints:
+            return prints[0]
+        
         endpoint = "/cards/named"
         param_key = "fuzzy" if fuzzy else "exact"
         return self._get(endpoint, {param_key: name})
     
+    def _parallel_get(self, *calls: Callable[[], Any]) -> List[Any]:
+        """
+        Führt unabhängige API-Aufrufe gleichzeitig aus
+        
+        Args:
+            calls: Funktionen ohne Argumente (z.B. lambda: self._get(...))
+        
+        Returns:
+            Ergebnisse in der Reihenfolge der Aufrufe
+        """
+        futures = [self._executor.submit(call) for call in calls]
+        return [future.result() for future in futures]
+    
+    def get_card_with_prints(self, name: str) -> Optional[Dict]:
+        """
+        Findet eine Karte und lädt gleichzeitig alle ihre Druckversionen
+        
+        Statt cards/named -> prints_search_uri nacheinander läuft die exakte
+        Namenssuche über alle Prints parallel zur unscharfen Namenssuche.
+        Die Prints landen im Instanz-Cache, get_all_prints braucht danach
+        keine Anfrage mehr.
+        
+        Args:
+            name: Kartenname (z.B. aus der OCR)
+        
+        Returns:
+            Kartendaten oder None
+        """
+        if " ".join(name.split()).lower() in self._prints_cache:
+            return self.get_card_by_name(name)
+        
+        card, prints = self._parallel_get(
+            lambda: self.get_card_by_name(name),
+            lambda: self.search_cards(f'!"{name}"', unique="prints", order="released")
+        )
+        
+        # Nur übernehmen, wenn die exakte Suche dieselbe Karte gefunden hat
+        if card and prints and prints[0].get("oracle_id") == card.get("oracle_id"):
+            self.add_prints({name: prints, card.get("name", name): prints})
+        return card
+    
     def get_all_prints(self, card_name: str) -> List[Dict]:
         """
         Holt alle Druckversionen einer Karte
         
+        Ergebnisse werden pro Instanz gecacht, da Matcher und Erkenner die
+        Versionen derselben Karte mehrfach abfragen. Die Liste nur lesen.
+        
         Args:
             card_name: Name der Karte
         
         Returns:
             Liste aller Versionen der Karte
         """
+        cache_key = " ".join(card_name.split()).lower()
+        if cache_key in self._prints_cache:
+            return self._prints_cache[cache_key]
+        
+        prints = self._fetch_all_prints(card_name)
+        
+        # Leere Ergebnisse (z.B. Netzwerkfehler) nicht cachen
+        if prints:
+            self._prints_cache[cache_key] = prints
+        return prints
+    
+    def _fetch_all_prints(self, card_name: str) -> List[Dict]:
+        """Lädt alle Druckversionen einer Karte von Scryfall"""
         # Erst die Karte finden
         card = self.get_card_by_name(card_name)
         if not card:
@@ -110,14 +338,9 @@ class ScryfallAPI:
         # Alle Prints suchen
         prints_uri = card.get("prints_search_uri")
         if prints_uri:
-            self._rate_limit()
-            try:
-                response = self.session.get(prints_uri)
-                response.raise_for_status()
-                data = response.json()
-                return data.get("data", [])
-            except:
-                pass
+            prints = list(self._iter_pages(self._get_url(prints_uri)))
+            if prints:
+                return prints
         
         # Fallback: Manuelle Suche
         oracle_id = card.get("oracle_id")
@@ -126,6 +349,50 @@ class ScryfallAPI:
         
         return [card]
     
+    def add_prints(self, prints_by_name: Dict[str, List[Dict]]):
+        """
+        Übernimmt vorab geladene Druckversionen (z.B. aus den Bulk-Daten)
+        
+        get_all_prints beantwortet diese Namen danach ohne Netzwerkzugriff.
+        
+        Args:
+            prints_by_name: Kartenname -> Liste aller Versionen
+        """
+        for name, prints in prints_by_name.items():
+            if prints:
+                self._prints_cache[" ".join(name.split()).lower()] = prints
+    
+    def get_bulk_data_info(self, bulk_type: str = "default_cards") -> Optional[Dict]:
+        """
+        Holt die Metadaten einer Bulk-Datei (u.a. download_uri, updated_at)
+        
+        Args:
+            bulk_type: "default_cards", "oracle_cards", "all_cards", ...
+        
+        Returns:
+            Bulk-Data-Objekt oder None
+        """
+        return self._get(f"/bulk-data/{bulk_type.replace('_', '-')}")
+    
+    def download_bulk_data(self, url: str) -> List[Dict]:
+        """
+        Lädt eine Bulk-Datei (JSON-Liste aller Karten, ~150 MB)
+        
+        Args:
+            url: download_uri aus get_bulk_data_info
+        
+        Returns:
+            Liste von Kartendaten (leer bei Fehlern)
+        """
+        # Bulk-Dateien liegen auf data.scryfall.io, nicht auf der API (kein Rate Limit)
+        try:
+            response = self._send(url, timeout=300)
+            response.raise_for_status()
+            return _json(response)
+        except _HTTP_ERRORS as e:
+            print(f"Fehler beim Laden der Bulk-Daten: {e}")
+            return []
+    
     def get_card_image_url(self, card: Dict, size: str = "normal") -> Optional[str]:
         """
         Extrahiert die Bild-URL aus Kartendaten
@@ -163,9 +430,9 @@ class ScryfallAPI:
         if not url:
             return None
         
-        self._rate_limit()
+        # Bilder kommen vom CDN (*.scryfall.io), das Rate Limit gilt nur für die API
         try:
-            response = self.session.get(url)
+            response = self._send(url)
             response.raise_for_status()
             return response.content
         except:
@@ -193,7 +460,35 @@ class ScryfallAPI:
         Returns:
             Liste möglicher Kartennamen
         """
-        data = self._get("/cards/autocomplete", {"q": query})
+        # OCR liefert oft dieselben Namen mit abweichenden Leerzeichen/Großschreibung
+        normalized = " ".join(query.lower().split())
+        if not normalized:
+            return []
+        try:
+            return list(self._autocomplete_cached(normalized))
+        except LookupError:
+            return []
+    
+    def _fetch_autocomplete(self, normalized_query: str) -> tuple:
+        """
+        Fragt die Autovervollständigung ab (Ergebnis als Tupel für den LRU-Cache)
+        
+        Bei Fehlern wird eine Exception geworfen, damit lru_cache das
+        Ergebnis nicht speichert und der nächste Aufruf neu anfragt.
+        """
+        data = self._get("/cards/autocomplete", {"q": normalized_query})
+        if data is None:
+            raise LookupError(normalized_query)
+        return tuple(data.get("data", []))
+    
+    def get_card_names(self) -> List[str]:
+        """
+        Holt den Katalog aller Kartennamen (ein Request, ~30.000 Namen)
+        
+        Returns:
+            Liste aller Kartennamen
+        """
+        data = self._get("/catalog/card-names")
         if data:
             return data.get("data", [])
         return []
@@ -215,7 +510,8 @@ class ScryfallAPI:
             return self._get(f"/cards/{set_code}/{collector_number}")
         
         if set_code:
-            cards = self.search_cards(f'"{name}" set:{set_code}')
-            return cards[0] if cards else None
+            # Neueste Version zuerst, Folgeseiten werden nie geladen
+            cards = self._iter_search_cards(f'"{name}" set:{set_code}', order="released")
+            return next(cards, None)
         
         return self.get_card_by_name(name)